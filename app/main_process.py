@@ -4,13 +4,13 @@ import re
 import constants
 from app.models.crwl_api_models import Product as CrwlProduct
 from app.models.gsheet_model import Product
-from app.processes.crwl import extract_data
+from app.processes.competitor_matcher import CompetitorMatch, CompetitorMatcher
+from app.processes.crwl import iter_listing_pages
 from app.processes.crwl_api import crwl_api
 from app.processes.itemku_api import itemku_api
-from app.shared.consts import KEYWORD_SPLIT_BY_CHARACTER
 from app.utils.ggsheet import GSheet
 from app.utils.gsheet import worksheet
-from app.utils.stock_fake import calculate_price_stock_fake, get_row
+from app.utils.stock_fake import Row, calculate_price_stock_fake, get_row
 from app.utils.update_messages import (
     update_with_min_price_message,
     update_with_comparing_seller_message,
@@ -18,13 +18,6 @@ from app.utils.update_messages import (
 )
 
 
-def __filter_lower_than_target_price(
-        products: list[CrwlProduct],
-        target_price: int,
-) -> list[CrwlProduct]:
-    return [product for product in products if product.price < target_price]
-
-
 def update_product_price(
         product_id: int,
         target_price: int,
@@ -123,83 +116,53 @@ def calculate_competitive_price(
     return valid_target_price
 
 
+def find_competitors(
+        sb,
+        product: Product,
+        min_price: int,
+        max_price: int | None,
+) -> CompetitorMatch:
+    """
+    Match the competitor listing of the row against its blacklist,
+    include/exclude keywords and price range. The next listing pages are
+    only fetched while no valid competitor is found below the max price.
+    """
+    products, match = CompetitorMatcher(
+        include_keyword=product.INCLUDE_KEYWORD,
+        exclude_keyword=product.EXCLUDE_KEYWORD,
+        blacklist=product.blacklist(),
+        min_price=min_price,
+        max_price=max_price,
+    ).match_pages(
+        iter_listing_pages(
+            sb,
+            api=crwl_api,
+            url=product.PRODUCT_COMPARE,
+        )
+    )
+
+    print(f"Number of product: {len(products)}")
+    print(f"Valid products: {len(match.valid_products)}")
+    return match
+
+
 def check_product_compare_flow(
         sb,
         product: Product,
         index: int | None = None,
+        row: Row | None = None,
 ):
     min_price = product.min_price()
     max_price = product.max_price()
-    blacklist = product.blacklist()
-
-    crwl_api_res = extract_data(
-        sb,
-        api=crwl_api,
-        url=product.PRODUCT_COMPARE,
-    )
 
-    products = crwl_api_res.data.data
-
-    valid_products = []
-
-    valid_keywords_products: list[CrwlProduct] = []
-
-    min_price_product: CrwlProduct | None = None
-
-    for _product in products:
-        # Check shopname not in backlist
-        if _product.seller.shop_name not in blacklist:
-            # Check Include and Exclude keyword in product name
-            if (
-                    (
-                            product.INCLUDE_KEYWORD
-                            and all(
-                        (
-                                keyword.lower()
-                                in _product.name.lower() + _product.server_name.lower()
-                                if _product.server_name
-                                else ""
-                        )
-                        for keyword in product.INCLUDE_KEYWORD.split(
-                            KEYWORD_SPLIT_BY_CHARACTER
-                        )
-                    )
-                    )
-                    or product.INCLUDE_KEYWORD is None
-            ) and (
-                    product.EXCLUDE_KEYWORD
-                    and not any(
-                (
-                        keyword.lower()
-                        in _product.name.lower() + _product.server_name.lower()
-                        if _product.server_name
-                        else ""
-                )
-                for keyword in product.EXCLUDE_KEYWORD.split(
-                    KEYWORD_SPLIT_BY_CHARACTER
-                )
-            )
-                    or product.EXCLUDE_KEYWORD is None
-            ):
-                # print(f"VALID: {_product}")
-                valid_keywords_products.append(_product)
-                # Check product price in valid range
-                if (max_price and min_price <= _product.price <= max_price) or (
-                        max_price is None and min_price <= _product.price
-                ):
-                    valid_products.append(_product)
-                    if (
-                            min_price_product is None
-                            or _product.price < min_price_product.price
-                    ):
-                        min_price_product = _product
-
-    print(f"Number of product: {len(products)}")
-    print(f"Valid products: {len(valid_products)}")
+    match = find_competitors(sb, product, min_price, max_price)
+    min_price_product: CrwlProduct | None = match.min_price_product
+    # Price percentiles and depth of the competitors, added to the Note
+    competitor_stats_str = f"{match.stats()}\n"
 
     # project add order site price
     # get price in order site then compare with product price
-    order_site_min_price, stock_fake_items = calculate_order_site_price(index)
+    order_site_min_price, stock_fake_items = calculate_order_site_price(index, row)
     new_min_price = min_price
     stock_fake_str = ""
     od_min_price = None
@@ -230,12 +193,10 @@ def check_product_compare_flow(
             price=target_price,
             price_min=min_price,
             price_max=max_price,
-            lower_min_price_products=__filter_lower_than_target_price(
-                products=valid_keywords_products, target_price=target_price
-            ),
+            lower_min_price_products=match.cheaper_than(target_price),
         )
         print(note_message)
-        product.Note = note_message + stock_fake_str
+        product.Note = note_message + competitor_stats_str + stock_fake_str
         product.Last_update = last_update_message
         product.update()
     else:
@@ -274,12 +235,10 @@ def check_product_compare_flow(
             price_max=max_price,
             comparing_price=_compare_price,
             comparing_seller=_compare_seller,
-            lower_min_price_products=__filter_lower_than_target_price(
-                products=valid_keywords_products, target_price=target_price
-            ),
+            lower_min_price_products=match.cheaper_than(target_price),
         )
         print(note_message)
-        product.Note = note_message + stock_fake_str
+        product.Note = note_message + competitor_stats_str + stock_fake_str
         product.Last_update = last_update_message
         product.update()
 
@@ -288,6 +247,7 @@ def check_product_compare_flow2(
         sb,
         product: Product,
         index: int | None = None,
+        row: Row | None = None,
 ):
     """
     Compare product prices with competitors (CONDITIONAL UPDATE MODE).
@@ -295,88 +255,29 @@ def check_product_compare_flow2(
     """
     min_price = product.min_price()
     max_price = product.max_price()
-    blacklist = product.blacklist()
 
     # Get current price from Itemku API
     product_id = extract_product_id_from_product_link(product.Product_link)
     try:
         product_details = itemku_api.get_product_details(product_id)
-        # Response structure: {"success": true, "data": {"data": [{"id": ..., "price": ...}]}}
-        products_list = product_details.get("data", {}).get("data", [])
-        if not products_list or len(products_list) == 0:
+        products_list = product_details.data.data
+        if not products_list:
             raise Exception(f"Product {product_id} not found in response")
-        current_price = int(products_list[0].get("price", 0))
+        current_price = products_list[0].price
         print(f"Current price from API: {current_price}")
     except Exception as e:
         print(f"Error getting current price: {e}")
         print("Falling back to flow 1 behavior (always update)")
-        check_product_compare_flow(sb, product, index)
+        check_product_compare_flow(sb, product, index, row)
         return
 
-    crwl_api_res = extract_data(
-        sb,
-        api=crwl_api,
-        url=product.PRODUCT_COMPARE,
-    )
-
-    products = crwl_api_res.data.data
-
-    valid_products = []
-    valid_keywords_products: list[CrwlProduct] = []
-    min_price_product: CrwlProduct | None = None
-
-    for _product in products:
-        # Check shopname not in blacklist
-        if _product.seller.shop_name not in blacklist:
-            # Check Include and Exclude keyword in product name
-            if (
-                    (
-                            product.INCLUDE_KEYWORD
-                            and all(
-                        (
-                                keyword.lower()
-                                in _product.name.lower() + _product.server_name.lower()
-                                if _product.server_name
-                                else ""
-                        )
-                        for keyword in product.INCLUDE_KEYWORD.split(
-                            KEYWORD_SPLIT_BY_CHARACTER
-                        )
-                    )
-                    )
-                    or product.INCLUDE_KEYWORD is None
-            ) and (
-                    product.EXCLUDE_KEYWORD
-                    and not any(
-                (
-                        keyword.lower()
-                        in _product.name.lower() + _product.server_name.lower()
-                        if _product.server_name
-                        else ""
-                )
-                for keyword in product.EXCLUDE_KEYWORD.split(
-                    KEYWORD_SPLIT_BY_CHARACTER
-                )
-            )
-                    or product.EXCLUDE_KEYWORD is None
-            ):
-                valid_keywords_products.append(_product)
-                # Check product price in valid range
-                if (max_price and min_price <= _product.price <= max_price) or (
-                        max_price is None and min_price <= _product.price
-                ):
-                    valid_products.append(_product)
-                    if (
-                            min_price_product is None
-                            or _product.price < min_price_product.price
-                    ):
-                        min_price_product = _product
-
-    print(f"Number of product: {len(products)}")
-    print(f"Valid products: {len(valid_products)}")
+    match = find_competitors(sb, product, min_price, max_price)
+    min_price_product: CrwlProduct | None = match.min_price_product
+    # Price percentiles and depth of the competitors, added to the Note
+    competitor_stats_str = f"{match.stats()}\n"
 
     # Get order site price
-    order_site_min_price, stock_fake_items = calculate_order_site_price(index)
+    order_site_min_price, stock_fake_items = calculate_order_site_price(index, row)
     new_min_price = min_price
     stock_fake_str = ""
     od_min_price = None
@@ -431,7 +332,7 @@ def check_product_compare_flow2(
                 lower_min_price_products=[]
             )
             print(note_message)
-            product.Note = note_message + stock_fake_str
+            product.Note = note_message + competitor_stats_str + stock_fake_str
             product.Last_update = last_update_message
             product.update()
 
@@ -444,12 +345,10 @@ def check_product_compare_flow2(
                 target_price=target_price,
                 price_min=min_price,
                 price_max=max_price,
-                lower_min_price_products=__filter_lower_than_target_price(
-                    products=valid_keywords_products, target_price=target_price
-                ),
+                lower_min_price_products=match.cheaper_than(target_price),
             )
             print(note_message)
-            product.Note = note_message + stock_fake_str
+            product.Note = note_message + competitor_stats_str + stock_fake_str
             product.Last_update = last_update_message
             product.update()
 
@@ -473,12 +372,10 @@ def check_product_compare_flow2(
                 price=target_price,
                 price_min=min_price,
                 price_max=max_price,
-                lower_min_price_products=__filter_lower_than_target_price(
-                    products=valid_keywords_products, target_price=target_price
-                ),
+                lower_min_price_products=match.cheaper_than(target_price),
             )
             print(note_message)
-            product.Note = note_message + stock_fake_str
+            product.Note = note_message + competitor_stats_str + stock_fake_str
             product.Last_update = last_update_message
             product.update()
 
@@ -521,12 +418,10 @@ def check_product_compare_flow2(
                 price=new_min_price,
                 price_min=min_price,
                 price_max=max_price,
-                lower_min_price_products=__filter_lower_than_target_price(
-                    products=valid_keywords_products, target_price=new_min_price
-                ),
+                lower_min_price_products=match.cheaper_than(new_min_price),
             )
             print(note_message)
-            product.Note = note_message + stock_fake_str
+            product.Note = note_message + competitor_stats_str + stock_fake_str
             product.Last_update = last_update_message
             product.update()
 
@@ -542,12 +437,10 @@ def check_product_compare_flow2(
                 price_max=max_price,
                 comparing_price=_compare_price,
                 comparing_seller=_compare_seller,
-                lower_min_price_products=__filter_lower_than_target_price(
-                    products=valid_keywords_products, target_price=target_price
-                ),
+                lower_min_price_products=match.cheaper_than(target_price),
             )
             print(note_message)
-            product.Note = note_message + stock_fake_str
+            product.Note = note_message + competitor_stats_str + stock_fake_str
             product.Last_update = last_update_message
             product.update()
 
@@ -574,12 +467,10 @@ def check_product_compare_flow2(
                 price_max=max_price,
                 comparing_price=_compare_price,
                 comparing_seller=_compare_seller,
-                lower_min_price_products=__filter_lower_than_target_price(
-                    products=valid_keywords_products, target_price=target_price
-                ),
+                lower_min_price_products=match.cheaper_than(target_price),
             )
             print(note_message)
-            product.Note = note_message + stock_fake_str
+            product.Note = note_message + competitor_stats_str + stock_fake_str
             product.Last_update = last_update_message
             product.update()
 
@@ -608,8 +499,11 @@ def no_check_product_compare_flow(
     product.update()
 
 
-def calculate_order_site_price(index: int | None = None):
-    gsheet = GSheet(constants.KEY_PATH)
+def calculate_order_site_price(
+        index: int | None = None,
+        row: Row | None = None,
+):
+    gsheet = GSheet()
 
     # g2g = G2G.get(worksheet, index)
     # bij = BIJ.get(worksheet, index)
@@ -630,10 +524,11 @@ def calculate_order_site_price(index: int | None = None):
     #     s3=p3,
     #     s4=p4,
     # )
-    row = get_row(
-        worksheet=worksheet,
-        row_index=index
-    )
+    if row is None:
+        row = get_row(
+            worksheet=worksheet,
+            row_index=index
+        )
     stock_fake_price_tuple, stock_fake_items = calculate_price_stock_fake(
         gsheet=gsheet, row=row, hostdata=constants.BIJ_HOST_DATA
     )
@@ -648,14 +543,15 @@ def process(
         sb,
         product: Product,
         index: int | None = None,
+        row: Row | None = None,
 ):
     if product.CHECK_PRODUCT_COMPARE == 1:
         print("Check product compare flow")
-        check_product_compare_flow(sb, product, index)
+        check_product_compare_flow(sb, product, index, row)
 
     elif product.CHECK_PRODUCT_COMPARE == 2:
         print("Compare but if current price is lower target then do nothing")
-        check_product_compare_flow2(sb, product, index)
+        check_product_compare_flow2(sb, product, index, row)
 
     else:
         print("No check product compare flow")
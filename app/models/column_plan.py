@@ -0,0 +1,174 @@
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+
+def column_index(col_letter: str) -> int:
+    """
+    1-based column index of an A1 column letter (A -> 1, AA -> 27).
+    """
+    index = 0
+    for char in col_letter.upper():
+        index = index * 26 + ord(char) - ord("A") + 1
+    return index
+
+
+def clean_cell(value: Any) -> Any:
+    """
+    Strip a string cell. An empty cell is None, as a single cell read does
+    not return it, but a whitespace-only cell stays "" like it did there.
+    """
+    if isinstance(value, str):
+        if not value:
+            return None
+        return value.strip()
+    return value
+
+
+@dataclass(frozen=True)
+class ColumnPlan:
+    """
+    Column layout of a ColSheetModel, compiled once per class.
+    """
+
+    # Field names in declaration order, with their column letters and 1-based
+    # column indexes at the same positions
+    fields: tuple[str, ...]
+    letters: tuple[str, ...]
+    indexes: tuple[int, ...]
+    # Positions in fields of the fields written back by update()
+    update_positions: tuple[int, ...]
+
+    @classmethod
+    def compile(
+        cls,
+        mapping: dict[str, str],
+        update_fields: set[str],
+    ) -> "ColumnPlan":
+        fields = tuple(mapping)
+        letters = tuple(mapping.values())
+        return cls(
+            fields=fields,
+            letters=letters,
+            indexes=tuple(column_index(letter) for letter in letters),
+            update_positions=tuple(
+                position for position, field_name in enumerate(fields) if field_name in update_fields
+            ),
+        )
+
+    @property
+    def mapping(self) -> dict[str, str]:
+        return dict(zip(self.fields, self.letters))
+
+    @property
+    def update_mapping(self) -> dict[str, str]:
+        return {self.fields[position]: self.letters[position] for position in self.update_positions}
+
+    def decode(
+        self,
+        row_values: list[Any],
+        first_col_index: int = 1,
+    ) -> dict[str, Any]:
+        """
+        Field values of a raw row, as a bulk sheet read returns it.
+
+        Args:
+            row_values: Cell values of one row, trailing empty cells may be
+                missing
+            first_col_index: Column index of row_values[0]
+        """
+        model_dict = {}
+        row_len = len(row_values)
+        for field_name, col_index in zip(self.fields, self.indexes):
+            position = col_index - first_col_index
+            model_dict[field_name] = clean_cell(row_values[position]) if 0 <= position < row_len else None
+        return model_dict
+
+
+def column_letter(col_index: int) -> str:
+    """
+    A1 column letter of a 1-based column index (1 -> A, 27 -> AA).
+    """
+    letters = ""
+    while col_index > 0:
+        col_index, remainder = divmod(col_index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+@dataclass(frozen=True)
+class RangePlan:
+    """
+    Contiguous column spans covering a set of columns, so a read requests
+    B5:Z5 instead of one range per cell.
+    """
+
+    # (first, last) 1-based column indexes of each span, in column order
+    spans: tuple[tuple[int, int], ...]
+
+    @classmethod
+    def for_indexes(
+        cls,
+        col_indexes: Iterable[int],
+    ) -> "RangePlan":
+        spans: list[list[int]] = []
+        for col_index in sorted(set(col_indexes)):
+            if spans and col_index == spans[-1][1] + 1:
+                spans[-1][1] = col_index
+            else:
+                spans.append([col_index, col_index])
+        return cls(spans=tuple((first, last) for first, last in spans))
+
+    @classmethod
+    def for_plans(
+        cls,
+        plans: Iterable[ColumnPlan],
+    ) -> "RangePlan":
+        return cls.for_indexes(col_index for plan in plans for col_index in plan.indexes)
+
+    @property
+    def first_col_index(self) -> int:
+        return self.spans[0][0] if self.spans else 1
+
+    @property
+    def width(self) -> int:
+        return self.spans[-1][1] - self.spans[0][0] + 1 if self.spans else 0
+
+    def ranges(
+        self,
+        first_row: int | None = None,
+        last_row: int | None = None,
+    ) -> list[str]:
+        """
+        A1 ranges of the spans over rows first_row..last_row, over whole
+        columns when no row is given
+        """
+        if first_row is None:
+            return [f"{column_letter(first)}:{column_letter(last)}" for first, last in self.spans]
+
+        last_row = first_row if last_row is None else last_row
+        return [
+            f"{column_letter(first)}{first_row}:{column_letter(last)}{last_row}"
+            for first, last in self.spans
+        ]
+
+    def assemble(
+        self,
+        results: list[list[list[Any]]],
+        row_count: int | None = None,
+    ) -> list[list[Any]]:
+        """
+        Raw rows starting at first_col_index from the value matrices of the
+        ranges, in the order of ranges(). A cell which is not in any span or
+        was not returned is None.
+        """
+        if row_count is None:
+            row_count = max((len(matrix) for matrix in results), default=0)
+
+        rows = [[None] * self.width for _ in range(row_count)]
+        for (first, last), matrix in zip(self.spans, results):
+            offset = first - self.first_col_index
+            span_width = last - first + 1
+            for row, row_values in zip(rows, matrix):
+                values = row_values[:span_width]
+                row[offset:offset + len(values)] = values
+        return rows
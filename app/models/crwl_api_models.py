@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class Game(BaseModel):
@@ -16,8 +16,12 @@ class ItemType(BaseModel):
     slug: str
 
 
+# The listing models only keep the fields read by the compare flows, the
+# rest of the 201-item payloads is skipped while validating the raw json
+
+
 class Seller(BaseModel):
-    id: int
+    # id: int
     shop_name: str
     # last_activity_at: str
     # average_rating: float
@@ -27,7 +31,7 @@ class Seller(BaseModel):
 
 
 class Product(BaseModel):
-    id: int
+    # id: int
     name: str
     # game_id: int
     # game: Game
@@ -41,7 +45,7 @@ class Product(BaseModel):
     # server_id: int
     server_name: str | None = None
     stock: int
-    base_unit: int
+    # base_unit: int
     seller: Seller
 
     def usd_price(
@@ -56,7 +60,7 @@ class Data(BaseModel):
     item_per_page: int
     current_page: int
     data: list[Product]
-    metadata: list
+    # metadata: list
 
 
 class CrwlAPIRes(BaseModel):
@@ -64,3 +68,16 @@ class CrwlAPIRes(BaseModel):
     data: Data
     message: str
     statusCode: str
+
+
+class CrwlQueryParams(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    game_id: int | None = None
+    item_type_id: int | None = None
+    item_info_group_id: int | None = None
+    item_info_id: int | None = None
+    server_id: int | None = None
+    keyword: str | None = None
+    # Listing page, the url only resolves the first one
+    page: int = 1
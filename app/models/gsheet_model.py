@@ -1,16 +1,75 @@
-from typing import Annotated, Self, Final
+import functools
+from typing import Annotated, Any, Self, Final
 
 from gspread.worksheet import Worksheet
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 
+from app.models.column_plan import ColumnPlan, RangePlan
 from app.shared.consts import COL_META_FIELD_NAME
 from app.shared.exceptions import SheetError
+from app.utils.blacklist_cache import blacklist_cache
 from app.utils.ggsheet import GSheet
 from app.utils.google_api import StockManager
+from app.utils.sheets_limiter import SHEETS_READ, SHEETS_WRITE, sheets_call
+from app.utils.write_buffer import SheetWriteBuffer
 
 IS_UPDATE_META: Final[str] = "is_update"
 
 
+def sheet_ref(
+        spreadsheet_id: str | None,
+        sheet_name: str | None,
+        cell: str | None,
+) -> tuple[str, str] | None:
+    """
+    The (spreadsheet id, A1 range) of an external cell reference, as the
+    StockManager getters read it, or None if the reference is incomplete
+    """
+    if spreadsheet_id is None or sheet_name is None or cell is None:
+        return None
+    return spreadsheet_id, f"'{sheet_name}'!{cell}"
+
+
+def read_plan_rows(
+        worksheet: Worksheet,
+        range_plan: RangePlan,
+        first_row: int,
+        last_row: int | None = None,
+) -> list[list]:
+    """
+    Read the spans of range_plan over rows first_row..last_row with one
+    batch_get.
+
+    Returns:
+        One raw row per sheet row, starting at range_plan.first_col_index
+    """
+    last_row = first_row if last_row is None else last_row
+    query_results = sheets_call(SHEETS_READ, worksheet.batch_get, range_plan.ranges(first_row, last_row))
+    return range_plan.assemble(query_results, last_row - first_row + 1)
+
+
+def cached_blacklist(
+        spreadsheet_id: str,
+        sheet_name: str,
+        cell: str,
+) -> frozenset[str]:
+    range_name = f"'{sheet_name}'!{cell}"
+    return blacklist_cache.get(
+        spreadsheet_id,
+        range_name,
+        lambda: StockManager(spreadsheet_id).get_multiple_str_cells(range_name),
+    )
+
+
+def uncached_refs(
+        refs: list[tuple[str, str] | None],
+) -> list[tuple[str, str]]:
+    """
+    Drop the incomplete references and the blacklists which are cached
+    """
+    return [ref for ref in refs if ref is not None and ref not in blacklist_cache]
+
+
 class ColSheetModel(BaseModel):
     # Model config
     model_config = ConfigDict(arbitrary_types_allowed=True)
@@ -18,60 +77,99 @@ class ColSheetModel(BaseModel):
     worksheet: Worksheet = Field(exclude=True)
     index: int
 
+    # When bound, update() queues the updated cells instead of writing them
+    _write_buffer: SheetWriteBuffer | None = PrivateAttr(default=None)
+    # Updatable field values as loaded or last saved, None if the model was
+    # not read from the sheet
+    _saved_values: dict[str, Any] | None = PrivateAttr(default=None)
+
+    def bind_write_buffer(
+            self,
+            write_buffer: SheetWriteBuffer | None,
+    ) -> Self:
+        self._write_buffer = write_buffer
+        return self
+
     @classmethod
-    def mapping_fields(cls) -> dict:
+    @functools.cache
+    def column_plan(cls) -> ColumnPlan:
+        """
+        Column layout of the model, compiled from the field metadata once per
+        class
+        """
         mapping_fields = {}
+        update_fields = set()
         for field_name, field_info in cls.model_fields.items():
             if hasattr(field_info, "metadata"):
                 for metadata in field_info.metadata:
                     if COL_META_FIELD_NAME in metadata:
                         mapping_fields[field_name] = metadata[COL_META_FIELD_NAME]
+                        if IS_UPDATE_META in metadata:
+                            update_fields.add(field_name)
                         break
 
-        return mapping_fields
+        return ColumnPlan.compile(mapping_fields, update_fields)
 
     @classmethod
-    def update_mapping_fields(cls) -> dict:
-        mapping_fields = {}
-        for field_name, field_info in cls.model_fields.items():
-            if hasattr(field_info, "metadata"):
-                for metadata in field_info.metadata:
-                    if COL_META_FIELD_NAME in metadata and IS_UPDATE_META in metadata:
-                        mapping_fields[field_name] = metadata[COL_META_FIELD_NAME]
-                        break
+    @functools.cache
+    def range_plan(cls) -> RangePlan:
+        """
+        Contiguous column spans of the model, read with one range each
+        """
+        return RangePlan.for_plans([cls.column_plan()])
 
-        return mapping_fields
+    @classmethod
+    def mapping_fields(cls) -> dict:
+        return cls.column_plan().mapping
 
     @classmethod
-    def get(
+    def from_row_values(
             cls,
             worksheet: Worksheet,
             index: int,
+            row_values: list,
+            first_col_index: int = 1,
     ) -> Self:
-        mapping_dict = cls.mapping_fields()
-
-        query_value = []
-
-        for _, v in mapping_dict.items():
-            query_value.append(f"{v}{index}")
+        """
+        Decode the model from a raw row of a bulk sheet read.
+
+        Args:
+            worksheet: Worksheet of the row
+            index: Sheet row index
+            row_values: Cell values of the row
+            first_col_index: Column index of row_values[0]
+        """
+        model_dict = cls.column_plan().decode(row_values, first_col_index)
+        model_dict["index"] = index
+        model_dict["worksheet"] = worksheet
+        model = cls.model_validate(model_dict)
+        model.mark_saved()
+        return model
+
+    def sheet_refs(self) -> list[tuple[str, str]]:
+        """
+        External cell references the model reads through StockManager, so
+        they can be prefetched for a whole round
+        """
+        return []
 
-        model_dict = {
-            "index": index,
-            "worksheet": worksheet,
-        }
+    @classmethod
+    def update_mapping_fields(cls) -> dict:
+        return cls.column_plan().update_mapping
 
-        query_results = worksheet.batch_get(query_value)
-        count = 0
-        for k, _ in mapping_dict.items():
-            model_dict[k] = query_results[count].first()
-            if isinstance(model_dict[k], str):
-                model_dict[k] = model_dict[k].strip()
-            count += 1
-        return cls.model_validate(model_dict)
+    @classmethod
+    def get(
+            cls,
+            worksheet: Worksheet,
+            index: int,
+    ) -> Self:
+        range_plan = cls.range_plan()
+        row_values = read_plan_rows(worksheet, range_plan, index)[0]
+        return cls.from_row_values(worksheet, index, row_values, range_plan.first_col_index)
 
-    def update(
+    def update_batch(
             self,
-    ) -> None:
+    ) -> list[dict]:
         mapping_dict = self.update_mapping_fields()
         model_dict = self.model_dump(mode="json")
 
@@ -84,7 +182,50 @@ class ColSheetModel(BaseModel):
                 }
             )
 
-        self.worksheet.batch_update(update_batch)
+        return update_batch
+
+    def update_values(self) -> dict[str, Any]:
+        return self.model_dump(mode="json", include=set(self.update_mapping_fields()))
+
+    def mark_saved(self) -> None:
+        """
+        Take the current updatable values as the ones in the sheet
+        """
+        self._saved_values = self.update_values()
+
+    def changed_fields(self) -> set[str]:
+        """
+        Updatable fields changed since the model was loaded or saved, or set
+        since it was created when it was not read from the sheet
+        """
+        if self._saved_values is None:
+            return set(self.update_mapping_fields()) & self.model_fields_set
+        return {
+            field_name
+            for field_name, value in self.update_values().items()
+            if value != self._saved_values.get(field_name)
+        }
+
+    def changed_update_batch(self) -> list[dict]:
+        """
+        update_batch() limited to the changed fields
+        """
+        mapping_dict = self.update_mapping_fields()
+        changed_ranges = {f"{mapping_dict[field_name]}{self.index}" for field_name in self.changed_fields()}
+        return [update for update in self.update_batch() if update["range"] in changed_ranges]
+
+    def update(
+            self,
+    ) -> None:
+        update_batch = self.update_batch()
+        if not update_batch:
+            return
+
+        if self._write_buffer is not None:
+            self._write_buffer.add(update_batch)
+        else:
+            sheets_call(SHEETS_WRITE, self.worksheet.batch_update, update_batch)
+        self.mark_saved()
 
 
 class FlexibleColSheetModel(ColSheetModel):
@@ -94,29 +235,16 @@ class FlexibleColSheetModel(ColSheetModel):
             worksheet: Worksheet,
             index: int,
     ) -> Self:
-        mapping_dict = cls.mapping_fields()
-        query_value = [f"{col}{index}" for col in mapping_dict.values()]
-
-        model_dict = {
-            "index": index,
-            "worksheet": worksheet,
-        }
-
+        range_plan = cls.range_plan()
         try:
-            query_results = worksheet.batch_get(query_value)
+            row_values = read_plan_rows(worksheet, range_plan, index)[0]
         except Exception as e:
             raise ValueError(f"Failed to batch_get values: {e}")
 
-        for i, (field_name, _) in enumerate(mapping_dict.items()):
-            try:
-                value = query_results[i].first()
-                model_dict[field_name] = value.strip() if isinstance(value, str) else value
-            except (IndexError, AttributeError):
-                model_dict[field_name] = None  # Trường không tồn tại hoặc giá trị rỗng
+        # Missing or empty cells are None
+        return cls.from_row_values(worksheet, index, row_values, range_plan.first_col_index)
 
-        return cls.model_validate(model_dict)
-
-    def update(self) -> None:
+    def update_batch(self) -> list[dict]:
         mapping_dict = self.update_mapping_fields()
         model_dict = self.model_dump(mode="json")
 
@@ -130,8 +258,7 @@ class FlexibleColSheetModel(ColSheetModel):
                     "values": [[value]],
                 })
 
-        if update_batch:
-            self.worksheet.batch_update(update_batch)
+        return update_batch
 
 
 class Product(ColSheetModel):
@@ -164,6 +291,14 @@ class Product(ColSheetModel):
     INCLUDE_KEYWORD: Annotated[str | None, {COL_META_FIELD_NAME: "Y"}] = None
     EXCLUDE_KEYWORD: Annotated[str | None, {COL_META_FIELD_NAME: "Z"}] = None
 
+    def sheet_refs(self) -> list[tuple[str, str]]:
+        return uncached_refs([
+            sheet_ref(self.IDSHEET_MIN, self.SHEET_MIN, self.CELL_MIN),
+            sheet_ref(self.IDSHEET_MAX, self.SHEET_MAX, self.CELL_MAX),
+            sheet_ref(self.IDSHEET_STOCK, self.SHEET_STOCK, self.CELL_STOCK),
+            sheet_ref(self.IDSHEET_BLACKLIST, self.SHEET_BLACKLIST, self.CELL_BLACKLIST),
+        ])
+
     def min_price(self) -> int:
         sheet_manager = StockManager(self.IDSHEET_MIN)
         min_price = sheet_manager.get_cell_float_value(f"'{self.SHEET_MIN}'!{self.CELL_MIN}")
@@ -205,14 +340,13 @@ class Product(ColSheetModel):
             f"{self.IDSHEET_STOCK}->{self.SHEET_STOCK}->{self.CELL_STOCK} is None"
         )
 
-    def blacklist(self) -> list[str]:
+    def blacklist(self) -> frozenset[str]:
         if self.IDSHEET_BLACKLIST is None or self.SHEET_BLACKLIST is None or self.CELL_BLACKLIST is None:
             raise SheetError(
                 f"{self.IDSHEET_BLACKLIST}->{self.SHEET_BLACKLIST}->{self.CELL_BLACKLIST} is None"
             )
 
-        sheet_manager = StockManager(self.IDSHEET_BLACKLIST)
-        blacklist = sheet_manager.get_multiple_str_cells(f"'{self.SHEET_BLACKLIST}'!{self.CELL_BLACKLIST}")
+        blacklist = cached_blacklist(self.IDSHEET_BLACKLIST, self.SHEET_BLACKLIST, self.CELL_BLACKLIST)
 
         if blacklist:
             return blacklist
@@ -234,14 +368,18 @@ class G2G(FlexibleColSheetModel):
     G2G_SHEET_BLACKLIST: Annotated[str | None, {COL_META_FIELD_NAME: "AI"}] = None
     G2G_CELL_BLACKLIST: Annotated[str | None, {COL_META_FIELD_NAME: "AJ"}] = None
 
+    def sheet_refs(self) -> list[tuple[str, str]]:
+        if self.G2G_CHECK != 1:
+            return []
+        return uncached_refs([
+            sheet_ref(self.G2G_IDSHEET_BLACKLIST, self.G2G_SHEET_BLACKLIST, self.G2G_CELL_BLACKLIST)
+        ])
+
     def get_blacklist(
             self,
             gsheet: GSheet,
-    ) -> list[str]:
-        sheet_manager = StockManager(self.G2G_IDSHEET_BLACKLIST)
-        blacklist = sheet_manager.get_multiple_str_cells(f"'{self.G2G_SHEET_BLACKLIST}'!{self.G2G_CELL_BLACKLIST}")
-        # blacklist = [item for sublist in query_values for item in sublist]
-        return blacklist
+    ) -> frozenset[str]:
+        return cached_blacklist(self.G2G_IDSHEET_BLACKLIST, self.G2G_SHEET_BLACKLIST, self.G2G_CELL_BLACKLIST)
 
 
 # BE BF BG BH BI BJ BK BL BM BN BO BP BQ BR BS
@@ -262,10 +400,15 @@ class FUN(FlexibleColSheetModel):
     FUN_SHEET_BLACKLIST: Annotated[str | None, {COL_META_FIELD_NAME: "AX"}] = None
     FUN_CELL_BLACKLIST: Annotated[str | None, {COL_META_FIELD_NAME: "AY"}] = None
 
-    def get_blacklist(self) -> list[str]:
-        sheet_manager = StockManager(self.FUN_IDSHEET_BLACKLIST)
-        blacklist = sheet_manager.get_multiple_str_cells(f"'{self.FUN_SHEET_BLACKLIST}'!{self.FUN_CELL_BLACKLIST}")
-        return blacklist
+    def sheet_refs(self) -> list[tuple[str, str]]:
+        if self.FUN_CHECK != 1:
+            return []
+        return uncached_refs([
+            sheet_ref(self.FUN_IDSHEET_BLACKLIST, self.FUN_SHEET_BLACKLIST, self.FUN_CELL_BLACKLIST)
+        ])
+
+    def get_blacklist(self) -> frozenset[str]:
+        return cached_blacklist(self.FUN_IDSHEET_BLACKLIST, self.FUN_SHEET_BLACKLIST, self.FUN_CELL_BLACKLIST)
 
 
 # BT BJ BV BW BX BY BZ CA CB CC CD
@@ -282,10 +425,15 @@ class BIJ(FlexibleColSheetModel):
     BIJ_SHEET_BLACKLIST: Annotated[str | None, {COL_META_FIELD_NAME: "BI"}] = None
     BIJ_CELL_BLACKLIST: Annotated[str | None, {COL_META_FIELD_NAME: "BJ"}] = None
 
-    def get_blacklist(self, gsheet: GSheet) -> list[str]:
-        sheet_manager = StockManager(self.BIJ_IDSHEET_BLACKLIST)
-        blacklist = sheet_manager.get_multiple_str_cells(f"'{self.BIJ_SHEET_BLACKLIST}'!{self.BIJ_CELL_BLACKLIST}")
-        return blacklist
+    def sheet_refs(self) -> list[tuple[str, str]]:
+        if self.BIJ_CHECK != 1:
+            return []
+        return uncached_refs([
+            sheet_ref(self.BIJ_IDSHEET_BLACKLIST, self.BIJ_SHEET_BLACKLIST, self.BIJ_CELL_BLACKLIST)
+        ])
+
+    def get_blacklist(self, gsheet: GSheet) -> frozenset[str]:
+        return cached_blacklist(self.BIJ_IDSHEET_BLACKLIST, self.BIJ_SHEET_BLACKLIST, self.BIJ_CELL_BLACKLIST)
 
 
 # CS CT CU CV CW CX
@@ -307,6 +455,12 @@ class PriceSheet1(FlexibleColSheetModel):
     SHEET_PRICE: Annotated[str | None, {COL_META_FIELD_NAME: "BV"}] = None
     CELL_PRICE: Annotated[str | None, {COL_META_FIELD_NAME: "BW"}] = None
 
+    def sheet_refs(self) -> list[tuple[str, str]]:
+        ref = sheet_ref(self.ID_SHEET_PRICE, self.SHEET_PRICE, self.CELL_PRICE)
+        if self.SHEET_CHECK != 1 or ref is None:
+            return []
+        return [ref]
+
     def get_price(self) -> float:
         sheet_manager = StockManager(self.ID_SHEET_PRICE)
         price = sheet_manager.get_cell_float_value(f"'{self.SHEET_PRICE}'!{self.CELL_PRICE}")
@@ -322,6 +476,12 @@ class PriceSheet2(FlexibleColSheetModel):
     SHEET_PRICE: Annotated[str | None, {COL_META_FIELD_NAME: "CC"}] = None
     CELL_PRICE: Annotated[str | None, {COL_META_FIELD_NAME: "CD"}] = None
 
+    def sheet_refs(self) -> list[tuple[str, str]]:
+        ref = sheet_ref(self.ID_SHEET_PRICE, self.SHEET_PRICE, self.CELL_PRICE)
+        if self.SHEET_CHECK != 1 or ref is None:
+            return []
+        return [ref]
+
     def get_price(self) -> float:
         sheet_manager = StockManager(self.ID_SHEET_PRICE)
         price = sheet_manager.get_cell_float_value(f"'{self.SHEET_PRICE}'!{self.CELL_PRICE}")
@@ -337,6 +497,12 @@ class PriceSheet3(FlexibleColSheetModel):
     SHEET_PRICE: Annotated[str | None, {COL_META_FIELD_NAME: "CJ"}] = None
     CELL_PRICE: Annotated[str | None, {COL_META_FIELD_NAME: "CK"}] = None
 
+    def sheet_refs(self) -> list[tuple[str, str]]:
+        ref = sheet_ref(self.ID_SHEET_PRICE, self.SHEET_PRICE, self.CELL_PRICE)
+        if self.SHEET_CHECK != 1 or ref is None:
+            return []
+        return [ref]
+
     def get_price(self) -> float:
         sheet_manager = StockManager(self.ID_SHEET_PRICE)
         price = sheet_manager.get_cell_float_value(f"'{self.SHEET_PRICE}'!{self.CELL_PRICE}")
@@ -352,6 +518,12 @@ class PriceSheet4(FlexibleColSheetModel):
     SHEET_PRICE: Annotated[str | None, {COL_META_FIELD_NAME: "CQ"}] = None
     CELL_PRICE: Annotated[str | None, {COL_META_FIELD_NAME: "CR"}] = None
 
+    def sheet_refs(self) -> list[tuple[str, str]]:
+        ref = sheet_ref(self.ID_SHEET_PRICE, self.SHEET_PRICE, self.CELL_PRICE)
+        if self.SHEET_CHECK != 1 or ref is None:
+            return []
+        return [ref]
+
     def get_price(self) -> float:
         sheet_manager = StockManager(self.ID_SHEET_PRICE)
         price = sheet_manager.get_cell_float_value(f"'{self.SHEET_PRICE}'!{self.CELL_PRICE}")
@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+
+
+class ItemkuProduct(BaseModel):
+    # id: int
+    name: str | None = None
+    price: int = 0
+    stock: int | None = None
+
+
+class ItemkuProductList(BaseModel):
+    data: list[ItemkuProduct] = Field(default_factory=list)
+
+
+class ItemkuProductListRes(BaseModel):
+    success: bool = False
+    data: ItemkuProductList = Field(default_factory=ItemkuProductList)
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+from ..models.crwl_api_models import CrwlAPIRes, CrwlQueryParams
+
+
+class CompetitorSnapshotCache:
+    """
+    Per-round cache of the CrwlAPI.product listings, keyed by the resolved
+    query params, so rows comparing against the same listing share one
+    fetch and apply their own filters to it.
+
+    Concurrent requests of a key wait on the single in-flight fetch. A
+    listing is kept until the next round, or for COMPETITOR_CACHE_MAX_AGE
+    seconds when a round runs longer.
+    """
+
+    def __init__(
+        self,
+        max_age: float | None = None,
+    ) -> None:
+        self._max_age = max_age
+        self._entries: dict[CrwlQueryParams, tuple[float, Future]] = {}
+        self._counts = {"hit": 0, "wait": 0, "miss": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def max_age(self) -> float:
+        if self._max_age is not None:
+            return self._max_age
+        return float(os.getenv("COMPETITOR_CACHE_MAX_AGE", "60"))
+
+    def get_or_fetch(
+        self,
+        params: CrwlQueryParams,
+        fetch: Callable[[], CrwlAPIRes],
+    ) -> CrwlAPIRes:
+        with self._lock:
+            entry = self._entries.get(params)
+            if entry is not None and time.monotonic() - entry[0] <= self.max_age:
+                future = entry[1]
+                self._counts["hit" if future.done() else "wait"] += 1
+                is_owner = False
+            else:
+                future = Future()
+                self._entries[params] = (time.monotonic(), future)
+                self._counts["miss"] += 1
+                is_owner = True
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            res = fetch()
+        except BaseException as e:
+            # Waiters get the error too, the next request fetches again
+            with self._lock:
+                if self._entries.get(params, (0, None))[1] is future:
+                    del self._entries[params]
+            future.set_exception(e)
+            raise
+
+        future.set_result(res)
+        return res
+
+    def put(
+        self,
+        params: CrwlQueryParams,
+        res: CrwlAPIRes,
+    ) -> None:
+        future = Future()
+        future.set_result(res)
+        with self._lock:
+            self._entries[params] = (time.monotonic(), future)
+
+    def new_round(self) -> None:
+        """
+        Drop the listings of the last round and reset the round counters
+        """
+        with self._lock:
+            self._entries = {
+                params: entry for params, entry in self._entries.items() if not entry[1].done()
+            }
+            self._counts = dict.fromkeys(self._counts, 0)
+
+    def __str__(self) -> str:
+        with self._lock:
+            counts = dict(self._counts)
+        return "Competitor cache: " + ", ".join(f"{k}={v}" for k, v in counts.items())
+
+
+competitor_cache = CompetitorSnapshotCache()
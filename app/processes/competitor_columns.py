@@ -0,0 +1,138 @@
+import os
+from dataclasses import dataclass
+
+from ..models.crwl_api_models import Product as CrwlProduct
+
+try:
+    import numpy as np
+except ImportError:
+    # Optional, the competitor filters fall back to Python loops
+    np = None
+
+STATS_PERCENTILES: tuple[int, ...] = (10, 50, 90)
+
+
+def columnar_enabled() -> bool:
+    """
+    Opt-in with CRWL_COLUMNAR=1 and the columnar extra installed
+    """
+    return np is not None and os.getenv("CRWL_COLUMNAR", "0") == "1"
+
+
+@dataclass
+class CompetitorStats:
+    # Keyword-valid competitors, those in the price range and those cheaper
+    # than the min price
+    depth: int
+    in_range: int
+    below_min: int
+    # Nearest-rank price percentiles of the keyword-valid competitors
+    percentiles: dict[int, int]
+
+    def __str__(self) -> str:
+        percentiles = ", ".join(f"P{q}={price}" for q, price in self.percentiles.items())
+        return (
+            f"Competitors: {self.depth} valid, {self.in_range} in range, "
+            f"{self.below_min} below min; {percentiles}"
+        )
+
+
+class CompetitorColumns:
+    """
+    NumPy columns of a competitor listing: price, stock, min_order, seller
+    index and the blacklist/keyword mask, so the price filters run as
+    vectorized operations.
+    """
+
+    def __init__(
+        self,
+        products: list[CrwlProduct],
+        keyword_mask: list[bool],
+    ) -> None:
+        self.products = products
+        self.sellers = list(dict.fromkeys(product.seller.shop_name for product in products))
+        seller_indexes = {shop_name: i for i, shop_name in enumerate(self.sellers)}
+
+        self.price = np.fromiter((p.price for p in products), dtype=np.int64, count=len(products))
+        self.stock = np.fromiter((p.stock for p in products), dtype=np.int64, count=len(products))
+        self.min_order = np.fromiter((p.min_order for p in products), dtype=np.int64, count=len(products))
+        self.seller_index = np.fromiter(
+            (seller_indexes[p.seller.shop_name] for p in products), dtype=np.int64, count=len(products)
+        )
+        self.keyword_mask = np.array(keyword_mask, dtype=bool)
+
+    def price_mask(
+        self,
+        min_price: int,
+        max_price: int | None,
+    ):
+        if max_price is None:
+            return self.keyword_mask & (self.price >= min_price)
+        if not max_price:
+            # A max price of 0 is set but falsy, no price is valid then
+            return np.zeros_like(self.keyword_mask)
+        return self.keyword_mask & (self.price >= min_price) & (self.price <= max_price)
+
+    def select(
+        self,
+        mask,
+    ) -> list[CrwlProduct]:
+        return [self.products[i] for i in np.flatnonzero(mask)]
+
+    def argmin(
+        self,
+        mask,
+    ) -> CrwlProduct | None:
+        """
+        First cheapest product of mask
+        """
+        if not mask.any():
+            return None
+        masked_price = np.where(mask, self.price, np.iinfo(np.int64).max)
+        return self.products[int(np.argmin(masked_price))]
+
+    def cheaper_than(
+        self,
+        target_price: int,
+    ) -> list[CrwlProduct]:
+        return self.select(self.keyword_mask & (self.price < target_price))
+
+    def stats(
+        self,
+        min_price: int,
+        max_price: int | None,
+    ) -> CompetitorStats:
+        valid_price = self.price[self.keyword_mask]
+        percentiles = {}
+        if valid_price.size:
+            values = np.percentile(valid_price, STATS_PERCENTILES, method="inverted_cdf")
+            percentiles = {q: int(v) for q, v in zip(STATS_PERCENTILES, values)}
+        return CompetitorStats(
+            depth=int(valid_price.size),
+            in_range=int(self.price_mask(min_price, max_price).sum()),
+            below_min=int((valid_price < min_price).sum()),
+            percentiles=percentiles,
+        )
+
+
+def competitor_stats(
+    valid_keywords_products: list[CrwlProduct],
+    valid_products: list[CrwlProduct],
+    min_price: int,
+) -> CompetitorStats:
+    """
+    CompetitorStats computed in Python, when NumPy is not installed
+    """
+    prices = sorted(product.price for product in valid_keywords_products)
+    percentiles = {}
+    if prices:
+        percentiles = {
+            # Integer ceil(q * n / 100), a float product can round past it
+            q: prices[max(0, -(-q * len(prices) // 100) - 1)] for q in STATS_PERCENTILES
+        }
+    return CompetitorStats(
+        depth=len(prices),
+        in_range=len(valid_products),
+        below_min=sum(1 for price in prices if price < min_price),
+        percentiles=percentiles,
+    )
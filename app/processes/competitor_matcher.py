@@ -0,0 +1,233 @@
+import functools
+import re
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from ..models.crwl_api_models import CrwlAPIRes, Product as CrwlProduct
+from ..shared.consts import KEYWORD_SPLIT_BY_CHARACTER
+from .competitor_columns import CompetitorColumns, CompetitorStats, columnar_enabled, competitor_stats
+
+
+@dataclass
+class CompetitorMatch:
+    # Products passing the blacklist and keyword filters
+    valid_keywords_products: list[CrwlProduct] = field(default_factory=list)
+    # Of those, the products inside the min/max price range
+    valid_products: list[CrwlProduct] = field(default_factory=list)
+    # The first cheapest valid product
+    min_price_product: CrwlProduct | None = None
+    min_price: int = 0
+    max_price: int | None = None
+    # Set when the listing was matched as NumPy columns, a view of the same
+    # result so it is not compared
+    columns: CompetitorColumns | None = field(default=None, compare=False)
+
+    def cheaper_than(
+        self,
+        target_price: int,
+    ) -> list[CrwlProduct]:
+        """
+        Keyword-valid products cheaper than target_price
+        """
+        if self.columns is not None:
+            return self.columns.cheaper_than(target_price)
+        return [product for product in self.valid_keywords_products if product.price < target_price]
+
+    def stats(self) -> CompetitorStats:
+        if self.columns is not None:
+            return self.columns.stats(self.min_price, self.max_price)
+        return competitor_stats(self.valid_keywords_products, self.valid_products, self.min_price)
+
+
+@dataclass(frozen=True)
+class KeywordFilter:
+    """
+    INCLUDE_KEYWORD/EXCLUDE_KEYWORD of a row, lowercased once.
+
+    A product matches when its name + server_name contains every include
+    keyword and none of the exclude keywords. A product without a server
+    name fails a set include filter and passes any exclude filter. An unset
+    (None) filter always passes, an empty one never does.
+    """
+
+    include_keywords: tuple[str, ...] | None
+    exclude_pattern: re.Pattern | None
+    include_set: bool
+    exclude_set: bool
+
+    def matches(
+        self,
+        name: str,
+        server_name: str | None,
+    ) -> bool:
+        if not server_name:
+            return self.include_keywords is None and (self.exclude_set or self.exclude_pattern is None)
+
+        haystack = name.lower() + server_name.lower()
+        if self.include_keywords is not None and not (
+            self.include_set and all(keyword in haystack for keyword in self.include_keywords)
+        ):
+            return False
+        if self.exclude_pattern is not None:
+            return self.exclude_set and self.exclude_pattern.search(haystack) is None
+        return True
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_keyword_filter(
+    include_keyword: str | None,
+    exclude_keyword: str | None,
+) -> KeywordFilter:
+    include_keywords = None
+    if include_keyword is not None:
+        include_keywords = tuple(dict.fromkeys(
+            keyword.lower() for keyword in include_keyword.split(KEYWORD_SPLIT_BY_CHARACTER)
+        ))
+
+    exclude_pattern = None
+    if exclude_keyword is not None:
+        # One alternation finds any exclude keyword in a single scan
+        exclude_pattern = re.compile("|".join(
+            re.escape(keyword) for keyword in dict.fromkeys(
+                keyword.lower() for keyword in exclude_keyword.split(KEYWORD_SPLIT_BY_CHARACTER)
+            )
+        ))
+
+    return KeywordFilter(
+        include_keywords=include_keywords,
+        exclude_pattern=exclude_pattern,
+        include_set=bool(include_keyword),
+        exclude_set=bool(exclude_keyword),
+    )
+
+
+class CompetitorMatcher:
+    """
+    Blacklist, keyword and price filters of a row, built once and applied
+    to the competitor products in a single pass.
+    """
+
+    def __init__(
+        self,
+        include_keyword: str | None,
+        exclude_keyword: str | None,
+        blacklist: frozenset[str],
+        min_price: int,
+        max_price: int | None,
+    ) -> None:
+        self.keyword_filter = compile_keyword_filter(include_keyword, exclude_keyword)
+        self.blacklist = blacklist
+        self.min_price = min_price
+        self.max_price = max_price
+
+    def is_price_valid(
+        self,
+        price: int,
+    ) -> bool:
+        if self.max_price is None:
+            return self.min_price <= price
+        # A max price of 0 is set but falsy, no price is valid then
+        return bool(self.max_price) and self.min_price <= price <= self.max_price
+
+    def is_past_max_price(
+        self,
+        price: int,
+    ) -> bool:
+        """
+        Whether no product from this price on can be valid, in a listing
+        sorted by price
+        """
+        if self.max_price is None:
+            return False
+        return not self.max_price or price > self.max_price
+
+    def is_keyword_valid(
+        self,
+        product: CrwlProduct,
+    ) -> bool:
+        return product.seller.shop_name not in self.blacklist and self.keyword_filter.matches(
+            product.name, product.server_name
+        )
+
+    def match(
+        self,
+        products: list[CrwlProduct],
+    ) -> CompetitorMatch:
+        return self.match_keyword_mask(products, [self.is_keyword_valid(product) for product in products])
+
+    def match_keyword_mask(
+        self,
+        products: list[CrwlProduct],
+        keyword_mask: list[bool],
+    ) -> CompetitorMatch:
+        """
+        Match products whose blacklist and keyword filters are already
+        applied, keyword_mask[i] is whether products[i] passed them
+        """
+        if columnar_enabled():
+            return self.match_columns(products, keyword_mask)
+
+        result = CompetitorMatch(min_price=self.min_price, max_price=self.max_price)
+        for product, is_keyword_valid in zip(products, keyword_mask):
+            if not is_keyword_valid:
+                continue
+
+            result.valid_keywords_products.append(product)
+            if self.is_price_valid(product.price):
+                result.valid_products.append(product)
+                if result.min_price_product is None or product.price < result.min_price_product.price:
+                    result.min_price_product = product
+
+        return result
+
+    def match_columns(
+        self,
+        products: list[CrwlProduct],
+        keyword_mask: list[bool],
+    ) -> CompetitorMatch:
+        """
+        Same result as match(), with the price range and the cheapest
+        product computed on columns
+        """
+        columns = CompetitorColumns(products, keyword_mask)
+        price_mask = columns.price_mask(self.min_price, self.max_price)
+        return CompetitorMatch(
+            valid_keywords_products=columns.select(columns.keyword_mask),
+            valid_products=columns.select(price_mask),
+            min_price_product=columns.argmin(price_mask),
+            min_price=self.min_price,
+            max_price=self.max_price,
+            columns=columns,
+        )
+
+    def match_pages(
+        self,
+        pages: Iterable[CrwlAPIRes],
+    ) -> tuple[list[CrwlProduct], CompetitorMatch]:
+        """
+        Match the pages of a listing sorted by price, and stop reading pages
+        once a valid product is found or the prices pass the max price.
+
+        Each product is filtered once as its page arrives, the match is
+        built once from all pages read.
+
+        Returns:
+            The products of the pages read and their match
+        """
+        products: list[CrwlProduct] = []
+        keyword_mask: list[bool] = []
+        for res in pages:
+            page_products = res.data.data
+            page_mask = [self.is_keyword_valid(product) for product in page_products]
+            products.extend(page_products)
+            keyword_mask.extend(page_mask)
+
+            if any(
+                is_keyword_valid and self.is_price_valid(product.price)
+                for product, is_keyword_valid in zip(page_products, page_mask)
+            ):
+                break
+            if not products or self.is_past_max_price(products[-1].price):
+                break
+
+        return products, self.match_keyword_mask(products, keyword_mask)
@@ -1,44 +1,86 @@
+import os
+import re
 import time
-from bs4 import BeautifulSoup
+from typing import Final, Iterator
+
+from pydantic import ValidationError
 
 
 from ..shared.exceptions import CrwlError
 from ..models.crwl_models import NextData1st, NextData2nd
-from ..models.crwl_api_models import CrwlAPIRes
+from ..models.crwl_api_models import CrwlAPIRes, CrwlQueryParams
+from ..shared.consts import CRWL_PRODUCT_PER_PAGE
 from .crwl_api import CrwlAPI
+from .competitor_cache import competitor_cache
+from .crwl_capture import get_capture
+from .crwl_fetch import crwl_fetch_stats, fetch_page_source
+from .crwl_params_cache import crwl_params_cache
 from ..utils.decorators import retry_on_fail
+from ..utils.browser_pool import lease_browser
+from ..utils.host_limiter import ITEMKU_HOST, host_slot
 
+NEXT_DATA_SCRIPT: Final[str] = (
+    "(() => { const tag = document.getElementById('__NEXT_DATA__'); "
+    "return tag ? tag.textContent : null; })()"
+)
+READY_POLL_INTERVAL: Final[float] = 0.05
+NEXT_DATA_PATTERN: Final[re.Pattern] = re.compile(
+    r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>',
+    re.DOTALL,
+)
 
-def get_soup(
-    sb,
-    url: str,
-) -> BeautifulSoup:
-    sb.cdp.get(url)
-    time.sleep(1)
-    page_source = sb.cdp.get_page_source()
-
-    # try:
-    #     res.raise_for_status()
-    # except Exception:
-    #     raise CrwlError(f"Can not get soup!!!. Status code: {res.status_code}")
 
-    return BeautifulSoup(page_source, "html.parser")
+def wait_for_page_ready(
+    sb,
+    script: str,
+):
+    """
+    Evaluate script in the page until it returns a truthy value, at most
+    CRWL_READY_TIMEOUT seconds, and record how long it took.
+
+    Returns:
+        The last value of the script
+    """
+    timeout = float(os.getenv("CRWL_READY_TIMEOUT", "10"))
+    start_time = time.monotonic()
+    while True:
+        value = sb.cdp.evaluate(script)
+        elapsed = time.monotonic() - start_time
+        if value or elapsed >= timeout:
+            break
+        sb.cdp.sleep(READY_POLL_INTERVAL)
+
+    crwl_fetch_stats.observe("ready_wait", elapsed)
+    if not value:
+        print(f"Page was not ready after {elapsed:.2f}s")
+        crwl_fetch_stats.incr("ready_timeout")
+    return value
+
+
+def find_next_data_text(
+    page_source: str,
+) -> str | None:
+    match = NEXT_DATA_PATTERN.search(page_source)
+    if match:
+        return match.group(1)
+    return None
 
 
-def extract_next_data(
-    soup: BeautifulSoup,
+def parse_next_data(
+    next_data_text: str,
 ) -> NextData1st | NextData2nd:
-    next_data_tag = soup.select_one("#__NEXT_DATA__")
-    if next_data_tag:
-        try:
-            return NextData1st.model_validate_json(next_data_tag.get_text())
-        except Exception:
-            pass
-        # return NextData2nd.model_validate_json(next_data_tag.get_text())
+    # Listing pages carry the game info, product pages the product detail,
+    # so the model is picked from the keys instead of trying both
+    has_game_info = '"gameInfo"' in next_data_text
+    has_product_detail = '"productDetail"' in next_data_text
+    if has_game_info:
         try:
-            return NextData2nd.model_validate_json(next_data_tag.get_text())
-        except Exception:
-            pass
+            return NextData1st.model_validate_json(next_data_text)
+        except ValidationError:
+            if not has_product_detail:
+                raise
+    if has_product_detail:
+        return NextData2nd.model_validate_json(next_data_text)
     raise CrwlError("Can't extract next data")
 
 
@@ -115,30 +157,144 @@ def find_keyword(
     return None
 
 
+def find_query_params(
+    next_data: NextData1st | NextData2nd,
+) -> CrwlQueryParams:
+    return CrwlQueryParams(
+        game_id=find_game_id(next_data),
+        item_type_id=find_item_type_id(next_data),
+        item_info_group_id=find_item_info_group_id(next_data),
+        item_info_id=find_item_info_id(next_data),
+        server_id=find_server_id(next_data),
+        keyword=find_keyword(next_data),
+    )
+
+
+def get_browser_listing(
+    sb,
+    url: str,
+) -> tuple[CrwlQueryParams, CrwlAPIRes | None]:
+    """
+    Load the page in the browser and read only the __NEXT_DATA__ text from
+    it, instead of transferring the whole rendered DOM.
+
+    With CRWL_CAPTURE_API=1 the product listing the page requests itself is
+    captured from the network layer as well.
+
+    Returns:
+        The query params of the page and the captured listing, if any
+    """
+    with lease_browser(sb) as browser, host_slot(ITEMKU_HOST):
+        capture = None
+        if os.getenv("CRWL_CAPTURE_API", "0") == "1":
+            capture = get_capture(browser)
+            capture.reset()
+        browser.cdp.get(url)
+        next_data_text = wait_for_page_ready(browser, NEXT_DATA_SCRIPT)
+        if not next_data_text:
+            raise CrwlError(f"Can't find next data of {url}")
+
+        params = find_query_params(parse_next_data(next_data_text))
+
+        product_res = None
+        if capture is not None:
+            product_res = capture.wait_for_listing(
+                params,
+                timeout=float(os.getenv("CRWL_CAPTURE_TIMEOUT", "3")),
+            )
+
+    crwl_fetch_stats.incr("browser")
+    if product_res is not None:
+        crwl_fetch_stats.incr("captured_api")
+    return params, product_res
+
+
+def resolve_listing(
+    sb,
+    url: str,
+) -> tuple[CrwlQueryParams, CrwlAPIRes | None]:
+    """
+    Resolve the CrwlAPI.product params of a compare url.
+
+    Returns:
+        The query params and the product listing captured from the browser,
+        if the page was loaded there and requested it
+    """
+    # The __NEXT_DATA__ json is server-rendered, the browser is only needed
+    # when the plain request gets a bot challenge
+    if os.getenv("CRWL_HTTP_FETCH", "1") == "1":
+        page_source = fetch_page_source(url)
+        if page_source is not None:
+            next_data_text = find_next_data_text(page_source)
+            if next_data_text is not None:
+                return find_query_params(parse_next_data(next_data_text)), None
+
+    return get_browser_listing(sb, url)
+
+
 @retry_on_fail(max_retries=3, sleep_interval=2)
 def extract_data(
     sb,
     api: CrwlAPI,
     url: str,
 ) -> CrwlAPIRes:
-    soup = get_soup(sb, url)
-
-    next_data = extract_next_data(soup)
-
-    game_id = find_game_id(next_data)
-    item_type_id = find_item_type_id(next_data)
-    item_info_id = find_item_info_id(next_data)
-    server_id = find_server_id(next_data)
-    item_info_group_id = find_item_info_group_id(next_data)
-    keyword = find_keyword(next_data)
-
-    res = api.product(
-        game_id=game_id,
-        item_type_id=item_type_id,
-        item_info_group_id=item_info_group_id,
-        item_info_id=item_info_id,
-        server_id=server_id,
-        keyword=keyword,
-    )
+    params = crwl_params_cache.get(url)
+    if params is not None:
+        try:
+            return competitor_cache.get_or_fetch(params, lambda: api.product(**params.model_dump()))
+        except Exception as e:
+            print(f"Cached query params of {url} failed, resolve them again: {e}")
+            crwl_params_cache.invalidate(url)
+
+    params, res = resolve_listing(sb, url)
+
+    # Only call the API when the page did not request the listing itself
+    if res is None:
+        res = competitor_cache.get_or_fetch(params, lambda: api.product(**params.model_dump()))
+    else:
+        competitor_cache.put(params, res)
+
+    crwl_params_cache.set(url, params)
 
     return res
+
+
+def is_last_page(
+    res: CrwlAPIRes,
+) -> bool:
+    data = res.data
+    return len(data.data) < data.item_per_page or data.current_page * data.item_per_page >= data.total_item
+
+
+def iter_listing_pages(
+    sb,
+    api: CrwlAPI,
+    url: str,
+    max_pages: int | None = None,
+) -> Iterator[CrwlAPIRes]:
+    """
+    Pages of the competitor listing of a compare url, cheapest first.
+
+    Page 1 comes from extract_data, each next page is only requested when
+    the iterator is advanced past the previous one, up to CRWL_MAX_PAGES
+    pages or the last page of the listing.
+    """
+    if max_pages is None:
+        max_pages = int(os.getenv("CRWL_MAX_PAGES", "3"))
+
+    res = extract_data(sb, api=api, url=url)
+    yield res
+
+    params = crwl_params_cache.get(url)
+    # A listing captured from the browser may use another page size, its
+    # next pages would not line up with the ones of CrwlAPI.product
+    if params is None or res.data.item_per_page != CRWL_PRODUCT_PER_PAGE:
+        return
+
+    for page in range(2, max_pages + 1):
+        if is_last_page(res):
+            return
+        page_params = params.model_copy(update={"page": page})
+        res = competitor_cache.get_or_fetch(page_params, lambda: api.product(**page_params.model_dump()))
+        crwl_fetch_stats.incr("extra_page")
+        yield res
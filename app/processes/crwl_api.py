@@ -1,7 +1,8 @@
 import requests
 
-from ..shared.consts import CRWL_API_BASE_URL
+from ..shared.consts import CRWL_API_BASE_URL, CRWL_PRODUCT_PER_PAGE
 from ..models.crwl_api_models import CrwlAPIRes
+from ..utils.host_limiter import ITEMKU_HOST, limit_host
 
 
 class CrwlAPI:
@@ -10,7 +11,8 @@ class CrwlAPI:
     ) -> None:
         pass
 
-    def product(
+    @limit_host(ITEMKU_HOST)
+    def product_content(
         self,
         game_id: int | None = None,
         item_type_id: int | None = None,
@@ -18,7 +20,8 @@ class CrwlAPI:
         item_info_id: int | None = None,
         server_id: int | None = None,
         keyword: str | None = None,
-    ):
+        page: int = 1,
+    ) -> bytes:
         query_string = {
             "game_id": game_id,
             "item_type_id": item_type_id,
@@ -26,8 +29,8 @@ class CrwlAPI:
             "item_info_id": item_info_id,
             # "server_id": server_id,
             "sort": "cheap",
-            "page": 1,
-            "per_page": 201,
+            "page": page,
+            "per_page": CRWL_PRODUCT_PER_PAGE,
             "keyword": keyword,
             "country_codes[]": "ID",
             # "is_default_product_list": 1,
@@ -53,7 +56,30 @@ class CrwlAPI:
 
         res.raise_for_status()
 
-        return CrwlAPIRes.model_validate(res.json())
+        return res.content
+
+    def product(
+        self,
+        game_id: int | None = None,
+        item_type_id: int | None = None,
+        item_info_group_id: int | None = None,
+        item_info_id: int | None = None,
+        server_id: int | None = None,
+        keyword: str | None = None,
+        page: int = 1,
+    ) -> CrwlAPIRes:
+        # Validated from the raw bytes, without building the json dicts first
+        return CrwlAPIRes.model_validate_json(
+            self.product_content(
+                game_id=game_id,
+                item_type_id=item_type_id,
+                item_info_group_id=item_info_group_id,
+                item_info_id=item_info_id,
+                server_id=server_id,
+                keyword=keyword,
+                page=page,
+            )
+        )
 
     def expansion_country(
         self,
@@ -0,0 +1,153 @@
+import base64
+import time
+import weakref
+from typing import Final
+from urllib.parse import parse_qs, urlparse
+
+import mycdp
+from pydantic import ValidationError
+
+from ..models.crwl_api_models import CrwlAPIRes, CrwlQueryParams
+from ..shared.consts import CRWL_API_BASE_URL, CRWL_PRODUCT_PER_PAGE
+
+PRODUCT_API_URL: Final[str] = f"{CRWL_API_BASE_URL}/product?"
+
+# Query params which have to match the params resolved from the page, so a
+# product list of another widget on the page is not taken for the listing
+MATCHED_QUERY_PARAMS: Final[tuple[str, ...]] = (
+    "game_id",
+    "item_type_id",
+    "item_info_group_id",
+    "item_info_id",
+    "keyword",
+)
+
+
+class ProductResponseCapture:
+    """
+    Record the api-gateway product responses a page requests itself, using
+    the CDP network events of the browser.
+    """
+
+    def __init__(
+        self,
+        sb,
+    ) -> None:
+        self.sb = sb
+        # Urls of the product responses by request id, until their body is
+        # loaded
+        self._pending: dict[str, str] = {}
+        self._responses: list[tuple[str, str]] = []
+        sb.cdp.add_handler(mycdp.network.ResponseReceived, self._on_response_received)
+        sb.cdp.add_handler(mycdp.network.LoadingFinished, self._on_loading_finished)
+
+    async def _on_response_received(
+        self,
+        event: mycdp.network.ResponseReceived,
+    ) -> None:
+        if event.response.url.startswith(PRODUCT_API_URL):
+            self._pending[event.request_id] = event.response.url
+
+    async def _on_loading_finished(
+        self,
+        event: mycdp.network.LoadingFinished,
+    ) -> None:
+        # The body can only be read once the response finished loading
+        url = self._pending.pop(event.request_id, None)
+        if url is not None:
+            self._responses.append((event.request_id, url))
+
+    def reset(self) -> None:
+        self._pending.clear()
+        self._responses.clear()
+
+    def wait_for_listing(
+        self,
+        params: CrwlQueryParams,
+        timeout: float,
+    ) -> CrwlAPIRes | None:
+        """
+        Wait until the page requested the product listing of params.
+
+        Returns:
+            The captured listing, or None if the page did not request it
+            before the timeout
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            res = self._find_listing(params)
+            if res is not None or time.monotonic() >= deadline:
+                return res
+            # Sleeping on the CDP loop lets it dispatch the network events
+            self.sb.cdp.sleep(0.2)
+
+    def _find_listing(
+        self,
+        params: CrwlQueryParams,
+    ) -> CrwlAPIRes | None:
+        for request_id, url in reversed(list(self._responses)):
+            if not _is_listing_request(url, params):
+                continue
+
+            # Each response body is read once, a response which is not a
+            # complete listing is not read again on the next poll
+            self._responses.remove((request_id, url))
+            try:
+                body, is_base64 = self.sb.cdp.loop.run_until_complete(
+                    self.sb.cdp.page.send(mycdp.network.get_response_body(request_id))
+                )
+            except Exception as e:
+                # A CDP or transport error, CrwlAPI.product is called if no
+                # other response is complete
+                print(f"Can't read captured product response: {e}")
+                continue
+
+            if is_base64:
+                body = base64.b64decode(body)
+
+            try:
+                res = CrwlAPIRes.model_validate_json(body)
+            except ValidationError as e:
+                print(f"Captured product response is not valid: {e}")
+                continue
+
+            if _is_complete_listing(url, res):
+                return res
+
+        return None
+
+
+def _is_listing_request(
+    url: str,
+    params: CrwlQueryParams,
+) -> bool:
+    query = parse_qs(urlparse(url).query)
+    params_dict = params.model_dump()
+    for name in MATCHED_QUERY_PARAMS:
+        value = params_dict[name]
+        if value is not None and query.get(name, [None])[0] != str(value):
+            return False
+    # A request without a page is the first one
+    return query.get("page", ["1"])[0] == str(params.page)
+
+
+def _is_complete_listing(
+    url: str,
+    res: CrwlAPIRes,
+) -> bool:
+    # The cheapest competitors are only in the response if it is sorted by
+    # price and as long as the page of CrwlAPI.product, or if it holds the
+    # whole listing
+    query = parse_qs(urlparse(url).query)
+    if query.get("sort", [None])[0] == "cheap" and res.data.item_per_page >= CRWL_PRODUCT_PER_PAGE:
+        return True
+    return res.data.total_item <= len(res.data.data)
+
+
+_captures: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_capture(sb) -> ProductResponseCapture:
+    if sb not in _captures:
+        _captures[sb] = ProductResponseCapture(sb)
+    return _captures[sb]
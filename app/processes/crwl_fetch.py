@@ -0,0 +1,128 @@
+import threading
+from typing import Final
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..utils.host_limiter import ITEMKU_HOST, host_slot
+
+HTTP_FETCH_TIMEOUT: Final[int] = 15
+
+DEFAULT_HEADERS: Final[dict[str, str]] = {
+    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "accept-language": "id-ID,id;q=0.9,en-US;q=0.8,en;q=0.7",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/135.0.0.0 Safari/537.36",
+}
+
+# Status codes and page markers of a bot challenge, the browser has to
+# solve those
+BOT_CHALLENGE_STATUS_CODES: Final[tuple[int, ...]] = (403, 429, 503)
+BOT_CHALLENGE_MARKERS: Final[tuple[str, ...]] = (
+    "challenge-platform",
+    "cf-chl-",
+    "Just a moment...",
+    "captcha",
+)
+
+
+class CrwlFetchStats:
+    """
+    Thread-safe counters and timings of how Itemku pages were fetched.
+    """
+
+    def __init__(self) -> None:
+        self._counts: dict[str, int] = {}
+        self._timings: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def incr(
+        self,
+        name: str,
+        value: int = 1,
+    ) -> None:
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + value
+
+    def observe(
+        self,
+        name: str,
+        seconds: float,
+    ) -> None:
+        """
+        Record a duration, kept as [count, total, max]
+        """
+        with self._lock:
+            timing = self._timings.setdefault(name, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def as_dict(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def timings(self) -> dict[str, tuple[int, float, float]]:
+        with self._lock:
+            return {k: (int(v[0]), v[1], v[2]) for k, v in self._timings.items()}
+
+    def __str__(self) -> str:
+        counts = ", ".join(f"{k}={v}" for k, v in sorted(self.as_dict().items()))
+        timings = ", ".join(
+            f"{k} avg={total / count:.2f}s max={max_seconds:.2f}s"
+            for k, (count, total, max_seconds) in sorted(self.timings().items())
+        )
+        return f"Crawl fetch stats: {counts}; {timings}"
+
+
+crwl_fetch_stats = CrwlFetchStats()
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+_session = _create_session()
+
+
+def is_bot_challenge(
+    status_code: int,
+    page_source: str,
+) -> bool:
+    if status_code in BOT_CHALLENGE_STATUS_CODES:
+        return True
+    return any(marker in page_source for marker in BOT_CHALLENGE_MARKERS)
+
+
+def fetch_page_source(
+    url: str,
+) -> str | None:
+    """
+    Fetch a page over the pooled HTTP session.
+
+    Returns:
+        The page source, or None if the page has to be loaded by the browser
+    """
+    try:
+        with host_slot(ITEMKU_HOST):
+            res = _session.get(url, timeout=HTTP_FETCH_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        print(f"HTTP fetch of {url} failed: {e}")
+        crwl_fetch_stats.incr("http_error")
+        return None
+
+    # A Next.js error page carries __NEXT_DATA__ too, only a 2xx page is
+    # the listing
+    if not res.ok or "__NEXT_DATA__" not in res.text:
+        if is_bot_challenge(res.status_code, res.text):
+            crwl_fetch_stats.incr("http_challenge")
+        else:
+            crwl_fetch_stats.incr("http_error")
+        return None
+
+    crwl_fetch_stats.incr("http")
+    return res.text
@@ -0,0 +1,98 @@
+import json
+import os
+import threading
+import time
+
+from pydantic import BaseModel
+
+from ..models.crwl_api_models import CrwlQueryParams
+from ..shared.consts import CRWL_PARAMS_CACHE_PATH
+
+
+class CrwlParamsCacheEntry(BaseModel):
+    params: CrwlQueryParams
+    resolved_at: float
+
+
+class CrwlParamsCache:
+    """
+    On-disk cache from a PRODUCT_COMPARE url to the query params of
+    CrwlAPI.product resolved from its page, so a steady-state round does not
+    need the browser.
+    """
+
+    def __init__(
+        self,
+        path: str = CRWL_PARAMS_CACHE_PATH,
+        ttl: float | None = None,
+    ) -> None:
+        self.path = path
+        self._ttl = ttl
+        self._entries: dict[str, CrwlParamsCacheEntry] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self) -> float:
+        if self._ttl is not None:
+            return self._ttl
+        return float(os.getenv("CRWL_PARAMS_CACHE_TTL", "86400"))
+
+    def get(
+        self,
+        url: str,
+    ) -> CrwlQueryParams | None:
+        with self._lock:
+            entry = self._load().get(url)
+        if entry is None or time.time() - entry.resolved_at > self.ttl:
+            return None
+        return entry.params
+
+    def set(
+        self,
+        url: str,
+        params: CrwlQueryParams,
+    ) -> None:
+        with self._lock:
+            self._load()[url] = CrwlParamsCacheEntry(
+                params=params,
+                resolved_at=time.time(),
+            )
+            self._save()
+
+    def invalidate(
+        self,
+        url: str,
+    ) -> None:
+        with self._lock:
+            if self._load().pop(url, None) is not None:
+                self._save()
+
+    def _load(self) -> dict[str, CrwlParamsCacheEntry]:
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                raw_entries = json.load(file)
+            for url, raw_entry in raw_entries.items():
+                self._entries[url] = CrwlParamsCacheEntry.model_validate(raw_entry)
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            print(f"Ignore broken crawl params cache {self.path}: {e}")
+            self._entries = {}
+
+        return self._entries
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(
+                {url: entry.model_dump(mode="json") for url, entry in self._entries.items()},
+                file,
+            )
+        os.replace(tmp_path, self.path)
+
+
+crwl_params_cache = CrwlParamsCache()
@@ -10,6 +10,8 @@ import hashlib
 
 import json
 
+from ..models.itemku_api_models import ItemkuProductListRes
+from ..utils.host_limiter import ITEMKU_HOST, limit_host
 
 
 def base64_url_encode(data):
@@ -54,10 +56,11 @@ class ItemkuAPI:
     def valid_price(self, price: int) -> int:
         return int(round(float(price) / 10, 0) * 10)
 
+    @limit_host(ITEMKU_HOST)
     def get_product_details(
         self,
         product_id: int,
-    ):
+    ) -> ItemkuProductListRes:
         """
         Get product details from Itemku API using product list endpoint.
 
@@ -66,8 +69,8 @@ class ItemkuAPI:
         Uses the product list API with id filter to get a single product's details.
 
         Returns:
-            dict: Product details including current price
-            Example response:
+            ItemkuProductListRes: Product details including current price,
+            validated from the raw response of:
             {
                 "success": true,
                 "data": {
@@ -108,8 +111,9 @@ class ItemkuAPI:
         )
         res.raise_for_status()
 
-        return res.json()
+        return ItemkuProductListRes.model_validate_json(res.content)
 
+    @limit_host(ITEMKU_HOST)
     def update_price(
         self,
         product_id: int,
@@ -144,6 +148,7 @@ class ItemkuAPI:
 
         return res.json()
 
+    @limit_host(ITEMKU_HOST)
     def update_stock(
         self,
         product_id: int,
@@ -5,6 +5,10 @@ COL_META_FIELD_NAME: Final[str] = "col_name_xxx"
 
 CRWL_API_BASE_URL: Final[str] = "https://api-gateway.itemku.com/v1"
 
+CRWL_PRODUCT_PER_PAGE: Final[int] = 201
+
 ITEMKU_API_BASE_URL: Final[str] = "https://tokoku-gateway.itemku.com/api"
 
 KEYWORD_SPLIT_BY_CHARACTER: Final[str] = ","
+
+CRWL_PARAMS_CACHE_PATH: Final[str] = "storage/crwl_params_cache.json"
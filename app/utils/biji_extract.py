@@ -6,6 +6,7 @@ from pydantic import BaseModel, Field, field_validator, ConfigDict, ValidationIn
 from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
 
 from app.models.gsheet_model import BIJ
+from app.utils.host_limiter import BIJ_HOST, limit_host
 
 
 class FlexibleBaseModel(BaseModel):
@@ -278,6 +279,7 @@ class GameService:
         # Only retry on network/HTTP errors
         reraise=False  # Do not re-raise the exception after the last attempt fails
     )
+    @limit_host(BIJ_HOST)
     def fetch_shop_demand(self, game_id: int, server_id: int) -> Optional['ShopDemandResponse']:
         url = "https://www.bijiaqi.com/api/shop/demand/listShopDemand"
         payload = {
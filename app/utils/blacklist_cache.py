@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable
+
+
+def normalize_blacklist(
+    names: Iterable[str],
+) -> frozenset[str]:
+    """
+    Strip the names of a blacklist column and drop the empty ones
+    """
+    return frozenset(name.strip() for name in names if name and name.strip())
+
+
+class BlacklistCache:
+    """
+    Bounded cache of the blacklist columns, keyed by (spreadsheet id, range).
+
+    A blacklist is kept for BLACKLIST_CACHE_TTL seconds and the least
+    recently used one is evicted when the cache holds BLACKLIST_CACHE_SIZE
+    ranges.
+    """
+
+    def __init__(
+        self,
+        max_size: int | None = None,
+        ttl: float | None = None,
+    ) -> None:
+        self.max_size = max_size or int(os.getenv("BLACKLIST_CACHE_SIZE", "256"))
+        self._ttl = ttl
+        self._entries: OrderedDict[tuple[str, str], tuple[float, frozenset[str]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self) -> float:
+        if self._ttl is not None:
+            return self._ttl
+        return float(os.getenv("BLACKLIST_CACHE_TTL", "900"))
+
+    def __contains__(
+        self,
+        key: tuple[str, str],
+    ) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() - entry[0] <= self.ttl
+
+    def get(
+        self,
+        spreadsheet_id: str,
+        range_name: str,
+        loader: Callable[[], Iterable[str]],
+    ) -> frozenset[str]:
+        """
+        The cached blacklist of the range, loaded with loader when it is
+        missing or expired
+        """
+        key = (spreadsheet_id, range_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        blacklist = normalize_blacklist(loader())
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), blacklist)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return blacklist
+
+    def invalidate(
+        self,
+        spreadsheet_id: str | None = None,
+        range_name: str | None = None,
+    ) -> None:
+        """
+        Drop the cached blacklists of a spreadsheet, of one of its ranges, or
+        every blacklist when no spreadsheet is given
+        """
+        with self._lock:
+            if spreadsheet_id is None:
+                self._entries.clear()
+                return
+
+            for key in list(self._entries):
+                if key[0] == spreadsheet_id and (range_name is None or key[1] == range_name):
+                    del self._entries[key]
+
+
+blacklist_cache = BlacklistCache()
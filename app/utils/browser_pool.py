@@ -0,0 +1,167 @@
+import os
+import queue
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Final
+
+from seleniumbase import SB
+
+BROWSER_START_URL: Final[str] = "https://www.itemku.com/"
+
+HEALTH_CHECK_SCRIPT: Final[str] = "1 + 1"
+MEMORY_SCRIPT: Final[str] = (
+    "performance.memory ? performance.memory.usedJSHeapSize : 0"
+)
+
+# A plain SB instance can only drive one page at a time, so workers which
+# share it take turns
+_shared_browser_lock = threading.Lock()
+
+
+class PooledBrowser:
+    def __init__(
+        self,
+        stack: ExitStack,
+        sb,
+    ) -> None:
+        self.stack = stack
+        self.sb = sb
+        self.navigations = 0
+        self.baseline_memory: int | None = None
+
+    def close(self) -> None:
+        try:
+            self.stack.close()
+        except Exception as e:
+            print(f"Error closing browser: {e}")
+
+
+class BrowserPool:
+    """
+    A small pool of UC browsers that row workers lease one at a time.
+
+    A browser is health checked before each lease and recycled when it is
+    unhealthy, after BROWSER_MAX_NAVIGATIONS leases or when its JS heap grew
+    by more than BROWSER_MAX_MEMORY_GROWTH_MB since it was launched.
+    """
+
+    def __init__(
+        self,
+        size: int | None = None,
+        max_navigations: int | None = None,
+        max_memory_growth_mb: int | None = None,
+    ) -> None:
+        self.size = size or int(os.getenv("BROWSER_POOL_SIZE", "1"))
+        self.max_navigations = max_navigations or int(os.getenv("BROWSER_MAX_NAVIGATIONS", "200"))
+        self.max_memory_growth = (
+            max_memory_growth_mb or int(os.getenv("BROWSER_MAX_MEMORY_GROWTH_MB", "300"))
+        ) * 1024 * 1024
+        # Browsers are launched lazily, a None slot is a browser to launch
+        self._browsers: queue.Queue[PooledBrowser | None] = queue.Queue()
+        for _ in range(self.size):
+            self._browsers.put(None)
+
+    def __enter__(self) -> "BrowserPool":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                browser = self._browsers.get_nowait()
+            except queue.Empty:
+                return
+            if browser is not None:
+                browser.close()
+
+    @contextmanager
+    def lease(self):
+        browser = self._browsers.get()
+        try:
+            if browser is not None and not self._is_healthy(browser):
+                print("Browser failed its health check, recycle it")
+                browser.close()
+                browser = None
+            if browser is None:
+                browser = self._launch()
+
+            try:
+                yield browser.sb
+            except Exception:
+                # A bad page only costs this lease, the browser is recycled
+                # only if it is broken
+                if not self._is_healthy(browser):
+                    print("Browser is unhealthy after a failed lease, recycle it")
+                    browser.close()
+                    browser = None
+                raise
+
+            browser.navigations += 1
+            if self._should_recycle(browser):
+                browser.close()
+                browser = None
+        finally:
+            self._browsers.put(browser)
+
+    def _launch(self) -> PooledBrowser:
+        stack = ExitStack()
+        try:
+            sb = stack.enter_context(SB(headless=True, uc=True))
+            sb.activate_cdp_mode(BROWSER_START_URL)
+        except Exception:
+            stack.close()
+            raise
+
+        browser = PooledBrowser(stack, sb)
+        browser.baseline_memory = self._memory(browser)
+        return browser
+
+    def _is_healthy(
+        self,
+        browser: PooledBrowser,
+    ) -> bool:
+        try:
+            return browser.sb.cdp.evaluate(HEALTH_CHECK_SCRIPT) == 2
+        except Exception as e:
+            print(f"Browser health check failed: {e}")
+            return False
+
+    def _memory(
+        self,
+        browser: PooledBrowser,
+    ) -> int:
+        try:
+            return int(browser.sb.cdp.evaluate(MEMORY_SCRIPT) or 0)
+        except Exception:
+            return 0
+
+    def _should_recycle(
+        self,
+        browser: PooledBrowser,
+    ) -> bool:
+        if browser.navigations >= self.max_navigations:
+            print(f"Recycle browser after {browser.navigations} navigations")
+            return True
+
+        memory = self._memory(browser)
+        if browser.baseline_memory and memory - browser.baseline_memory > self.max_memory_growth:
+            print(f"Recycle browser, JS heap grew to {memory // (1024 * 1024)}MB")
+            return True
+
+        return False
+
+
+@contextmanager
+def lease_browser(sb):
+    """
+    Lease a browser from sb when it is a BrowserPool, otherwise take turns on
+    the single SB instance.
+    """
+    if isinstance(sb, BrowserPool):
+        with sb.lease() as browser:
+            yield browser
+    else:
+        with _shared_browser_lock:
+            yield sb
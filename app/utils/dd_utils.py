@@ -7,6 +7,7 @@ from bs4 import BeautifulSoup, Tag
 from typing import List, Dict, Any, Optional, Tuple
 
 from app.models.gsheet_model import DD
+from app.utils.host_limiter import DD_HOST, limit_host
 
 
 class FilterParams:
@@ -128,6 +129,7 @@ class DD373Product:
         return asdict(self)
 
 
+@limit_host(DD_HOST)
 def get_dd373_listings(url: str) -> List[DD373Product]:
     """
     Scrapes product listings from DD373 website
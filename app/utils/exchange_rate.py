@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Final
+
+from app.utils.google_api import StockManager
+
+USD_IDR_RATE: Final[str] = "usd_idr"
+CNY_RATE: Final[str] = "cny"
+
+
+@dataclass
+class RateValue:
+    value: float
+    # time.monotonic() of the last successful load
+    loaded_at: float
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+
+def _load_usd_idr_rate() -> float:
+    rate_sheet = StockManager(os.getenv("RATE_SHEET_ID"))
+    return rate_sheet.get_cell_float_value(
+        f"'{os.getenv('RATE_SHEET_NAME')}'!{os.getenv('CELL_RATE_USD')}"
+    )
+
+
+def _load_cny_rate() -> float:
+    rate_sheet = StockManager(os.getenv("CNY_RATE_SPREADSHEET_ID"))
+    return rate_sheet.get_cell_float_value(
+        f"'{os.getenv('CNY_RATE_SHEET_NAME')}'!{os.getenv('CNY_RATE_CELL')}"
+    )
+
+
+class ExchangeRateService:
+    """
+    Exchange rates loaded once, refreshed every EXCHANGE_RATE_REFRESH_INTERVAL
+    seconds by a background thread and served from memory.
+
+    A failed refresh keeps the last good value of a rate, a rate which was
+    never loaded is served as its default.
+    """
+
+    def __init__(
+        self,
+        refresh_interval: float | None = None,
+    ) -> None:
+        self._refresh_interval = refresh_interval
+        self._loaders: dict[str, tuple[Callable[[], float], float]] = {}
+        self._values: dict[str, RateValue] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def refresh_interval(self) -> float:
+        if self._refresh_interval is not None:
+            return self._refresh_interval
+        return float(os.getenv("EXCHANGE_RATE_REFRESH_INTERVAL", "600"))
+
+    def register(
+        self,
+        name: str,
+        loader: Callable[[], float],
+        default: float,
+    ) -> None:
+        self._loaders[name] = (loader, default)
+
+    def get(
+        self,
+        name: str,
+    ) -> float:
+        with self._lock:
+            rate = self._values.get(name)
+        if rate is None:
+            # Not refreshed yet, load the rate on first use
+            rate = self._refresh_rate(name)
+        if rate is None:
+            return self._loaders[name][1]
+        return rate.value
+
+    def age(
+        self,
+        name: str,
+    ) -> float | None:
+        """
+        Seconds since the rate was last loaded, None if it never was
+        """
+        with self._lock:
+            rate = self._values.get(name)
+        return rate.age if rate is not None else None
+
+    def refresh(self) -> None:
+        for name in self._loaders:
+            self._refresh_rate(name)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="exchange-rate-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_interval)
+
+    def _refresh_rate(
+        self,
+        name: str,
+    ) -> RateValue | None:
+        loader, default = self._loaders[name]
+        try:
+            rate = RateValue(value=float(loader()), loaded_at=time.monotonic())
+        except Exception as e:
+            with self._lock:
+                rate = self._values.get(name)
+            if rate is None:
+                print(f"Error loading {name} exchange rate, using default rate {default}: {e}")
+            else:
+                print(f"Error refreshing {name} exchange rate, keep {rate.value} from {rate.age:.0f}s ago: {e}")
+            return rate
+
+        with self._lock:
+            self._values[name] = rate
+        return rate
+
+
+exchange_rates = ExchangeRateService()
+exchange_rates.register(USD_IDR_RATE, _load_usd_idr_rate, default=16326)
+exchange_rates.register(CNY_RATE, _load_cny_rate, default=1)
@@ -5,6 +5,7 @@ from requests.exceptions import HTTPError
 
 from app.decorator.retry import retry
 from .exceptions import FUNCrawlerError
+from .host_limiter import FUN_HOST, limit_host
 from ..models.gsheet_model import FUN
 
 
@@ -16,7 +17,7 @@ class FUNOfferItem(BaseModel):
     def is_valid(
             self,
             fun: "FUN",  # Assuming FUN model is defined elsewhere
-            fun_blacklist: list[str],
+            fun_blacklist: frozenset[str],
     ) -> bool:
         if self.seller in fun_blacklist:
             return False
@@ -29,7 +30,7 @@ class FUNOfferItem(BaseModel):
     def filter_valid_fun_offer_items(
             fun: "FUN",
             fun_offer_items: list["FUNOfferItem"],
-            fun_blacklist: list[str],
+            fun_blacklist: frozenset[str],
     ) -> list["FUNOfferItem"]:
         valid_fun_offer_items = []
         for fun_offer_item in fun_offer_items:
@@ -55,6 +56,7 @@ class FUNOfferItem(BaseModel):
 # =============================================================================
 
 @retry(retries=3, delay=1.2, exception=HTTPError)
+@limit_host(FUN_HOST)
 def __get_soup(url: str) -> BeautifulSoup:
     """Fetches and parses the HTML content of a URL."""
     headers = {
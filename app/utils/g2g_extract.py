@@ -8,6 +8,7 @@ from requests import HTTPError
 
 from app.decorator.retry import retry
 from app.models.gsheet_model import G2G
+from app.utils.host_limiter import G2G_HOST, limit_host
 
 
 class Seller(BaseModel):
@@ -75,7 +76,7 @@ class G2GOfferItem(BaseModel):
     def is_valid(
         self,
         g2g: G2G,
-        g2g_blacklist: list[str],
+        g2g_blacklist: frozenset[str],
     ) -> bool:
         if self.seller_name in g2g_blacklist:
             return False
@@ -95,7 +96,7 @@ class G2GOfferItem(BaseModel):
     def filter_valid_g2g_offer_item(
         g2g: G2G,
         g2g_offer_items: list["G2GOfferItem"],
-        g2g_blacklist: list[str],
+        g2g_blacklist: frozenset[str],
     ) -> list["G2GOfferItem"]:
         valid_g2g_offer_items = []
         for g2g_offer_item in g2g_offer_items:
@@ -186,6 +187,7 @@ def build_g2g_request_details(user_url: str, currency: str = 'JPY', country: str
 
     return api_url, headers
 
+@limit_host(G2G_HOST)
 def fetch_g2g_offers(user_url: str, currency: str = 'JPY', country: str = 'JP') -> dict | None:
     """
     Fetches offer data from G2G's API by converting a user-facing URL.
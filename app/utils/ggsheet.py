@@ -1,23 +1,20 @@
 import gspread.urls
 import gspread.utils
-from oauth2client.service_account import ServiceAccountCredentials
 import gspread
 
+from app.utils.google_auth import google_auth
+
 
 class GSheet:
     client: gspread.client.Client
 
-    def __init__(self, keypath="keys.json"):
-        self.client = self.__get_gspread(keypath)
-
-    def __get_gspread(self, keypath="keys.json"):
-        scope = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive",
-        ]
-        creds = ServiceAccountCredentials.from_json_keyfile_name(keypath, scope)  # type: ignore
-        client = gspread.auth.authorize(creds)  # type: ignore
-        return client
+    def __init__(self):
+        self.client = self.__get_gspread()
+
+    def __get_gspread(self):
+        # The client of the shared credentials and session (KEYS_PATH), so a
+        # GSheet is cheap to create
+        return google_auth.gspread_client()
 
     def get_sheet(
             self,
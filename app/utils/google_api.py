@@ -1,32 +1,230 @@
+import os
+import queue
+import threading
 import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Iterable
 
-from google.oauth2.service_account import Credentials
+import google_auth_httplib2
+import httplib2
 from googleapiclient.discovery import build
 
+from app.utils.google_auth import GOOGLE_SCOPES, google_auth
+from app.utils.sheets_limiter import SHEETS_READ, limit_sheets, sheets_call
+
+# Ranges per batchGet, keeps the request url within limits
+SHEET_REFS_BATCH_SIZE = 100
+
+
+class SheetsServiceCache:
+    """
+    Process-wide cache of the Sheets service, keyed by scopes.
+
+    The service of a scope set is built once, from the discovery document
+    bundled with the client, on the credentials of google_auth and shared by
+    every thread, so a token refreshed by any Google path is reused. httplib2 is
+    not thread-safe, so requests are executed on an authorized transport
+    leased from a pool, one per concurrent caller.
+    """
+
+    def __init__(self) -> None:
+        self._services: dict[tuple[str, ...], Any] = {}
+        self._transports: dict[tuple[str, ...], queue.LifoQueue] = {}
+        self._lock = threading.Lock()
+
+    def service(
+        self,
+        scopes: tuple[str, ...] = GOOGLE_SCOPES,
+    ):
+        credentials = google_auth.credentials(scopes)
+        with self._lock:
+            if scopes not in self._services:
+                self._services[scopes] = build(
+                    "sheets",
+                    "v4",
+                    credentials=credentials,
+                    static_discovery=True,
+                    cache_discovery=False,
+                )
+            return self._services[scopes]
+
+    @contextmanager
+    def lease_transport(
+        self,
+        scopes: tuple[str, ...] = GOOGLE_SCOPES,
+    ):
+        """
+        Lease an authorized httplib2 transport, a new one is created when
+        every pooled transport is in use
+        """
+        with self._lock:
+            transports = self._transports.setdefault(scopes, queue.LifoQueue())
+        try:
+            transport = transports.get_nowait()
+        except queue.Empty:
+            transport = google_auth_httplib2.AuthorizedHttp(
+                google_auth.credentials(scopes),
+                http=httplib2.Http(),
+            )
+        try:
+            yield transport
+        finally:
+            transports.put(transport)
+
+    def execute(
+        self,
+        request,
+        scopes: tuple[str, ...] = GOOGLE_SCOPES,
+    ) -> dict:
+        with self.lease_transport(scopes) as transport:
+            return request.execute(http=transport)
+
+
+sheets_service_cache = SheetsServiceCache()
+
+
+class SheetRefResolver:
+    """
+    Values of the external cell references of the rows about to run, read
+    with one values().batchGet per spreadsheet instead of one values().get
+    per cell.
+
+    StockManager reads a prefetched range from here for SHEET_REFS_MAX_AGE
+    seconds and falls back to its own request otherwise, so prices and stock
+    are never older than that. Rows are prefetched right before they run.
+    """
+
+    def __init__(
+        self,
+        max_age: float | None = None,
+    ) -> None:
+        self._max_age = max_age
+        # Expiry monotonic time and values by (spreadsheet id, A1 range)
+        self._entries: dict[tuple[str, str], tuple[float, list[list]]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def max_age(self) -> float:
+        if self._max_age is not None:
+            return self._max_age
+        return float(os.getenv("SHEET_REFS_MAX_AGE", "60"))
+
+    def prefetch(
+        self,
+        refs: Iterable[tuple[str, str]],
+        max_age: float | None = None,
+    ) -> None:
+        """
+        Read the values of the refs which are not prefetched yet.
+
+        Args:
+            refs: (spreadsheet id, A1 range) pairs
+            max_age: Seconds the values are used for, SHEET_REFS_MAX_AGE if
+                None
+        """
+        now = time.monotonic()
+        expires_at = now + (self.max_age if max_age is None else max_age)
+        with self._lock:
+            self._entries = {key: entry for key, entry in self._entries.items() if entry[0] >= now}
+            missing_refs = [ref for ref in dict.fromkeys(refs) if ref not in self._entries]
+
+        ranges_by_sheet: dict[str, list[str]] = defaultdict(list)
+        for spreadsheet_id, range_name in missing_refs:
+            ranges_by_sheet[spreadsheet_id].append(range_name)
+
+        values = {}
+        for spreadsheet_id, ranges in ranges_by_sheet.items():
+            try:
+                for range_name, range_values in StockManager(spreadsheet_id).batch_get_values(ranges).items():
+                    values[(spreadsheet_id, range_name)] = (expires_at, range_values)
+            except Exception as e:
+                # The rows of this spreadsheet read their cells one by one
+                print(f"Failed to prefetch {len(ranges)} ranges of {spreadsheet_id}: {e}")
+
+        with self._lock:
+            self._entries.update(values)
+        if ranges_by_sheet:
+            print(f"Prefetched {len(values)} sheet ranges from {len(ranges_by_sheet)} spreadsheets")
+
+    def get(
+        self,
+        spreadsheet_id: str,
+        range_name: str,
+    ) -> list[list] | None:
+        with self._lock:
+            entry = self._entries.get((spreadsheet_id, range_name))
+        if entry is None or time.monotonic() > entry[0]:
+            return None
+        return entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = {}
+
+
+sheet_ref_resolver = SheetRefResolver()
+
 
 class StockManager:
-    def __init__(self, spreadsheet_id: str):
-        self.credentials_file = "keys.json"
+    """
+    Cheap handle onto a spreadsheet, the service and the transports come
+    from sheets_service_cache.
+    """
+
+    def __init__(
+        self,
+        spreadsheet_id: str,
+        scopes: tuple[str, ...] = GOOGLE_SCOPES,
+    ):
         self.spreadsheet_id = spreadsheet_id
-        # time.sleep(1)
-        self.service = self._initialize_service()
+        self.scopes = scopes
 
-    def _initialize_service(self):
-        credentials = Credentials.from_service_account_file(
-            self.credentials_file,
-            scopes=["https://www.googleapis.com/auth/spreadsheets.readonly"]
-        )
-        return build('sheets', 'v4', credentials=credentials)
+    @property
+    def service(self):
+        return sheets_service_cache.service(self.scopes)
 
-    def get_cell_float_value(self, range_name: str) -> float:
-        try:
-            result = (
+    def batch_get_values(self, ranges: list[str]) -> dict[str, list[list]]:
+        """
+        Raw values of every range, with one batchGet per SHEET_REFS_BATCH_SIZE
+        ranges
+        """
+        values = {}
+        for start in range(0, len(ranges), SHEET_REFS_BATCH_SIZE):
+            batch = ranges[start:start + SHEET_REFS_BATCH_SIZE]
+            result = sheets_call(
+                SHEETS_READ,
+                self._execute,
                 self.service.spreadsheets()
                 .values()
-                .get(spreadsheetId=self.spreadsheet_id, range=range_name)
-                .execute()
+                .batchGet(spreadsheetId=self.spreadsheet_id, ranges=batch),
             )
-            cell_value = result.get('values', [[]])[0][0]
+            # valueRanges are in the order of the requested ranges
+            for range_name, value_range in zip(batch, result.get("valueRanges", [])):
+                values[range_name] = value_range.get("values", [])
+        return values
+
+    def _execute(self, request) -> dict:
+        return sheets_service_cache.execute(request, self.scopes)
+
+    def _get_values(self, range_name: str) -> list[list]:
+        values = sheet_ref_resolver.get(self.spreadsheet_id, range_name)
+        if values is not None:
+            return values
+        return self._fetch_values(range_name)
+
+    @limit_sheets(SHEETS_READ)
+    def _fetch_values(self, range_name: str) -> list[list]:
+        result = self._execute(
+            self.service.spreadsheets()
+            .values()
+            .get(spreadsheetId=self.spreadsheet_id, range=range_name)
+        )
+        return result.get("values", [])
+
+    def get_cell_float_value(self, range_name: str) -> float:
+        try:
+            cell_value = self._get_values(range_name)[0][0]
             # Remove commas and convert to float
             cell_value_clean = cell_value.replace(',', '')
             stock_value = float(cell_value_clean)
@@ -40,13 +238,7 @@ class StockManager:
 
     def get_cell_stock(self, range_name: str) -> float:
         try:
-            result = (
-                self.service.spreadsheets()
-                .values()
-                .get(spreadsheetId=self.spreadsheet_id, range=range_name)
-                .execute()
-            )
-            cell_value = result.get('values', [[]])[0][0]
+            cell_value = self._get_values(range_name)[0][0]
             # Convert to integer after handling float-like values
             stock_value = float(cell_value)
             return stock_value
@@ -56,12 +248,14 @@ class StockManager:
 
     def get_multiple_cells(self, ranges: list[str]) -> list[int]:
         try:
-            # Make a batch request for multiple ranges
-            result = (
+            # Make a batch request for multiple ranges, limited inside the
+            # try so a 429 reaches sheets_call before it is wrapped below
+            result = sheets_call(
+                SHEETS_READ,
+                self._execute,
                 self.service.spreadsheets()
                 .values()
-                .batchGet(spreadsheetId=self.spreadsheet_id, ranges=ranges)
-                .execute()
+                .batchGet(spreadsheetId=self.spreadsheet_id, ranges=ranges),
             )
             values = result.get("valueRanges", [])
             # Extract values from the response, convert to integers if possible
@@ -77,14 +271,8 @@ class StockManager:
 
     def get_multiple_str_cells(self, range_str: str) -> list[str]:
         try:
-            # Make a request for the single range
-            result = (
-                self.service.spreadsheets()
-                .values()
-                .get(spreadsheetId=self.spreadsheet_id, range=range_str)
-                .execute()
-            )
-            values = result.get("values", [])
+            # Read the single range, prefetched for the round if possible
+            values = self._get_values(range_str)
             # Extract values from the response as strings
             cell_values = [str(cell[0]) for cell in values if cell]
             return cell_values
@@ -0,0 +1,70 @@
+import os
+import threading
+from typing import Final
+
+import gspread
+from google.auth.transport.requests import AuthorizedSession
+from google.oauth2.service_account import Credentials
+
+from app.utils.paths import SRC_PATH
+
+# One scope set for every Google path, so they all share the same token
+GOOGLE_SCOPES: Final[tuple[str, ...]] = (
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+)
+
+
+class GoogleAuthProvider:
+    """
+    The service account credentials, authorized requests session and
+    gspread client shared by gsheet.py, GSheet and StockManager, so token
+    refreshes and connections are reused instead of each path keeping its
+    own.
+    """
+
+    def __init__(
+        self,
+        key_path: str | None = None,
+    ) -> None:
+        self._key_path = key_path
+        self._credentials: dict[tuple[str, ...], Credentials] = {}
+        self._session: AuthorizedSession | None = None
+        self._gspread_client: gspread.Client | None = None
+        self._lock = threading.RLock()
+
+    @property
+    def key_path(self) -> str:
+        if self._key_path is not None:
+            return self._key_path
+        return str(SRC_PATH.joinpath(os.getenv("KEYS_PATH", "keys.json")))
+
+    def credentials(
+        self,
+        scopes: tuple[str, ...] = GOOGLE_SCOPES,
+    ) -> Credentials:
+        with self._lock:
+            if scopes not in self._credentials:
+                self._credentials[scopes] = Credentials.from_service_account_file(
+                    self.key_path,
+                    scopes=list(scopes),
+                )
+            return self._credentials[scopes]
+
+    def session(self) -> AuthorizedSession:
+        with self._lock:
+            if self._session is None:
+                self._session = AuthorizedSession(self.credentials())
+            return self._session
+
+    def gspread_client(self) -> gspread.Client:
+        with self._lock:
+            if self._gspread_client is None:
+                self._gspread_client = gspread.Client(
+                    auth=self.credentials(),
+                    session=self.session(),
+                )
+            return self._gspread_client
+
+
+google_auth = GoogleAuthProvider()
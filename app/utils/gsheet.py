@@ -1,12 +1,10 @@
 import os
 
 from dotenv import load_dotenv
-from gspread.auth import service_account
-
-from app.utils.paths import SRC_PATH
+from app.utils.google_auth import google_auth
 
 load_dotenv("setting.env")
-g_client = service_account(SRC_PATH.joinpath(os.getenv("KEYS_PATH")))
+g_client = google_auth.gspread_client()
 
 spreadsheet = g_client.open_by_key(os.environ["SPREADSHEET_KEY"])
 
@@ -0,0 +1,62 @@
+import os
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Final
+
+ITEMKU_HOST: Final[str] = "itemku"
+G2G_HOST: Final[str] = "g2g"
+FUN_HOST: Final[str] = "funpay"
+BIJ_HOST: Final[str] = "bijiaqi"
+DD_HOST: Final[str] = "dd373"
+SHEETS_HOST: Final[str] = "sheets"
+
+# Default number of concurrent requests allowed per host, overridable with
+# HOST_LIMIT_<HOST> in setting.env (e.g. HOST_LIMIT_ITEMKU=2)
+DEFAULT_HOST_LIMITS: Final[dict[str, int]] = {
+    ITEMKU_HOST: 2,
+    G2G_HOST: 2,
+    FUN_HOST: 2,
+    BIJ_HOST: 2,
+    DD_HOST: 2,
+    SHEETS_HOST: 4,
+}
+
+_semaphores: dict[str, threading.BoundedSemaphore] = {}
+_semaphores_lock = threading.Lock()
+
+
+def host_limit(host: str) -> int:
+    value = os.getenv(f"HOST_LIMIT_{host.upper()}")
+    if value is None:
+        return DEFAULT_HOST_LIMITS.get(host, 1)
+    return max(1, int(value))
+
+
+def _get_semaphore(host: str) -> threading.BoundedSemaphore:
+    with _semaphores_lock:
+        if host not in _semaphores:
+            _semaphores[host] = threading.BoundedSemaphore(host_limit(host))
+        return _semaphores[host]
+
+
+@contextmanager
+def host_slot(host: str):
+    """
+    Hold one of the concurrent request slots of a host while the block runs.
+    """
+    semaphore = _get_semaphore(host)
+    with semaphore:
+        yield
+
+
+def limit_host(host: str):
+    def wrapper(func: Callable):
+        @wraps(func)
+        def inner(*args, **kwargs):
+            with host_slot(host):
+                return func(*args, **kwargs)
+
+        return inner
+
+    return wrapper
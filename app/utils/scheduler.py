@@ -0,0 +1,129 @@
+import heapq
+import threading
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class SchedulerStats:
+    queue_depth: int
+    running: int
+    overdue: int
+    max_lateness: float
+    avg_dispatch_lateness: float
+    dispatched: int
+
+    def __str__(self) -> str:
+        return (
+            f"Scheduler: queued={self.queue_depth}, running={self.running}, "
+            f"overdue={self.overdue}, max lateness={self.max_lateness:.1f}s, "
+            f"avg dispatch lateness={self.avg_dispatch_lateness:.1f}s "
+            f"over {self.dispatched} rows"
+        )
+
+
+class RowScheduler:
+    """
+    Min-heap of (next_due_time, row) that always hands out the most overdue
+    row first.
+
+    Rescheduling a row pushes a new heap entry, stale entries are skipped when
+    they reach the top of the heap.
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, int]] = []
+        self._due: dict[int, float] = {}
+        self._running: set[int] = set()
+        self._disabled: set[int] = set()
+        self._lock = threading.Lock()
+        self._dispatched = 0
+        self._total_lateness = 0.0
+
+    def sync(
+        self,
+        run_indexes: list[int],
+    ) -> None:
+        """
+        Add newly enabled rows as due now and drop rows which are no longer
+        enabled.
+        """
+        now = time.monotonic()
+        enabled = set(run_indexes)
+        with self._lock:
+            for index in list(self._due):
+                if index not in enabled:
+                    del self._due[index]
+            self._disabled = self._running - enabled
+            for index in run_indexes:
+                if index not in self._due and index not in self._running:
+                    self._push(index, now)
+
+    def pop_next(
+        self,
+        now: float | None = None,
+    ) -> int | None:
+        """
+        Pop the most overdue row, or None if no row is due yet.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return None
+            due, index = heapq.heappop(self._heap)
+            del self._due[index]
+            self._running.add(index)
+            self._dispatched += 1
+            self._total_lateness += now - due
+            return index
+
+    def reschedule(
+        self,
+        index: int,
+        delay: float,
+    ) -> None:
+        with self._lock:
+            self._running.discard(index)
+            if index in self._disabled:
+                self._disabled.discard(index)
+                return
+            self._push(index, time.monotonic() + delay)
+
+    def next_due_in(self) -> float | None:
+        """
+        Seconds until the next row is due, 0 if a row is already overdue.
+        """
+        with self._lock:
+            self._drop_stale()
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def stats(self) -> SchedulerStats:
+        now = time.monotonic()
+        with self._lock:
+            overdue = [due for due in self._due.values() if due <= now]
+            return SchedulerStats(
+                queue_depth=len(self._due),
+                running=len(self._running),
+                overdue=len(overdue),
+                max_lateness=now - min(overdue) if overdue else 0.0,
+                avg_dispatch_lateness=(
+                    self._total_lateness / self._dispatched if self._dispatched else 0.0
+                ),
+                dispatched=self._dispatched,
+            )
+
+    def _push(
+        self,
+        index: int,
+        due: float,
+    ) -> None:
+        self._due[index] = due
+        heapq.heappush(self._heap, (due, index))
+
+    def _drop_stale(self) -> None:
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
@@ -1,98 +1,146 @@
-from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Any, Type, TypeVar
 
-import gspread.urls
-import gspread.utils
 import gspread
-from typing import Type, Any, TypeVar
+from pydantic import ValidationError
 
+from app.models.column_plan import RangePlan
 from app.models.gsheet_model import ColSheetModel
-from pydantic import BaseModel, ValidationError
+from app.utils.sheets_limiter import SHEETS_READ, SHEETS_WRITE, sheets_call
 
 T = TypeVar("T", bound=ColSheetModel)
 
 
+@dataclass
+class RowError:
+    row_index: int
+    model: str
+    errors: list[Any]
+
+    def __str__(self) -> str:
+        return f"Validate error for {self.model} in row_index: {self.row_index}: {self.errors}"
+
+
+@dataclass
+class BulkLoadResult:
+    """
+    Models loaded by a bulk read, by model class and row index, and the rows
+    which failed to validate.
+    """
+
+    models: dict[type, dict[int, ColSheetModel]] = field(default_factory=dict)
+    errors: list[RowError] = field(default_factory=list)
+
+    def get(
+        self,
+        model: Type[T],
+        row_index: int,
+    ) -> T | None:
+        return self.models.get(model, {}).get(row_index)
+
+    def of(
+        self,
+        model: Type[T],
+    ) -> list[T]:
+        """
+        Valid models of a class, in row order
+        """
+        rows = self.models.get(model, {})
+        return [rows[index] for index in sorted(rows)]
+
+
+def _row_runs(row_index: list[int]) -> list[tuple[int, int]]:
+    """
+    Contiguous (first, last) runs of the row indexes, so sparse rows are not
+    read as one large block
+    """
+    runs: list[list[int]] = []
+    for index in sorted(set(row_index)):
+        if runs and index == runs[-1][1] + 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return [(first, last) for first, last in runs]
+
+
+def query_multi_model_from_worksheet(
+    worksheet: gspread.worksheet.Worksheet,
+    models: list[Type[ColSheetModel]],
+    row_index: list[int] | int,
+) -> BulkLoadResult:
+    """
+    Load every model type of models for every row of row_index with one
+    batch_get.
+
+    The columns of all models are read as contiguous spans over contiguous
+    row runs. A row which fails to validate for a model is reported in
+    BulkLoadResult.errors instead of failing the whole batch.
+    """
+    if isinstance(row_index, int):
+        row_index = [row_index]
+
+    result = BulkLoadResult(models={model: {} for model in models})
+    range_plan = RangePlan.for_plans(model.column_plan() for model in models)
+    runs = _row_runs(row_index)
+    if not range_plan.spans or not runs:
+        return result
+
+    ranges = [r for first, last in runs for r in range_plan.ranges(first, last)]
+    query_results = sheets_call(SHEETS_READ, worksheet.batch_get, ranges)
+
+    span_count = len(range_plan.spans)
+    for run_position, (first, last) in enumerate(runs):
+        run_results = query_results[run_position * span_count:(run_position + 1) * span_count]
+        rows = range_plan.assemble(run_results, last - first + 1)
+        for index, row_values in enumerate(rows, start=first):
+            for model in models:
+                try:
+                    result.models[model][index] = model.from_row_values(
+                        worksheet, index, row_values, range_plan.first_col_index
+                    )
+                except ValidationError as e:
+                    result.errors.append(RowError(index, model.__name__, e.errors()))
+
+    return result
+
+
 def query_model_from_worksheet(
     worksheet: gspread.worksheet.Worksheet,
     model: Type[T],
     row_index: list[int],
-) -> list[T]:
-    cells: list[str] = []
-    model_fields = app.models.fields_exclude_row_index()
-    for index in row_index:
-        for _, propers in model_fields.items():
-            cells.append(
-                f"{propers.metadata[0]}{index}",
-            )
-    query_values = [value.first() for value in worksheet.batch_get(cells)]
-    model_list: list[T] = []
-    num_of_keys = len(model_fields.keys())
-    for i, index in enumerate(row_index):
-        model_dict = {}
-        for j, model_field_name in enumerate(model_fields.keys()):
-            model_dict[model_field_name] = query_values[i * num_of_keys + j]
-        try:
-            _model = app.models.model_validate(
-                model_dict,
-            )
-        except ValidationError as e:
-            raise ValidationError(f"Validate error for {model} in row_index: {index}") from e
-
-        _app.models.row_index = index
-        model_list.append(_model)
-    return model_list
+) -> BulkLoadResult:
+    """
+    Load one model type for every row of row_index with one batch_get, the
+    models are in BulkLoadResult.of(model)
+    """
+    return query_multi_model_from_worksheet(worksheet, [model], row_index)
 
 
 def update_model_to_worksheet(
     worksheet: gspread.worksheet.Worksheet,
-    models: list[T],
-) -> None:
-    class UpdateCell(BaseModel):
-        range: str
-        values: Any
+    models: list[ColSheetModel],
+) -> int:
+    """
+    Write the updatable cells which changed since each model was loaded or
+    saved with one batch_update, so unchanged cells and edits made in the
+    sheet meanwhile are left alone.
 
+    Returns:
+        The number of updated ranges
+    """
+    changed_models = []
     data = []
     for model in models:
-        model_fields = app.models.fields_exclude_row_index()
-        model_dict = app.models.model_dump(mode="json")
-        for field_name, proper in model_fields.items():
-            data.append(
-                UpdateCell(
-                    range=f"{proper.metadata[0]}{app.models.row_index}",
-                    values=[[model_dict[field_name]]],
-                ).model_dump()
-            )
+        update_batch = model.changed_update_batch()
+        if update_batch:
+            changed_models.append(model)
+            data.extend(update_batch)
 
-    worksheet.batch_update(data)
-
-
-def query_multi_model_from_worksheet(
-    worksheet: gspread.worksheet.Worksheet,
-    models: list[Type[T]],
-    row_index: int,
-) -> list[Type[T]]:
-    cells: list[str] = []
-    for model in models:
-        model_fields = app.models.fields_exclude_row_index()
-        for _, proper in model_fields.items():
-            cells.append(
-                f"{proper.metadata[0]}{row_index}",
-            )
-    query_values = [value.first() for value in worksheet.batch_get(cells)]
-    result_model = []
-    count: int = 0
-    for i, model in enumerate(models):
-        model_dict = {}
-        model_fields = app.models.fields_exclude_row_index()
-        for j, field_name in enumerate(model_fields.keys()):
-            model_dict[field_name] = query_values[count]
-            count += 1
-        try:
-            _model = app.models.model_validate(model_dict)
-            _app.models.row_index = row_index
-            result_app.models.append(_model)
-        except ValidationError as e:
-            raise ValidationError(f"Validate error for {model} in row_index: {i}") from e
-    return result_model
+    if data:
+        sheets_call(SHEETS_WRITE, worksheet.batch_update, data)
+        for model in changed_models:
+            model.mark_saved()
+    return len(data)
 
 
 def update_string_to_worksheet(
@@ -100,5 +148,5 @@ def update_string_to_worksheet(
     cell: str,
     value: str,
 ) -> None:
-    worksheet.update(cell, value)
-
+    # gspread 6 takes the values first
+    sheets_call(SHEETS_WRITE, worksheet.update, [[value]], cell)
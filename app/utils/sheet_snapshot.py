@@ -0,0 +1,140 @@
+from typing import Any, Final, Type, TypeVar
+
+import gspread
+from pydantic import ValidationError
+
+from app.models.column_plan import RangePlan, clean_cell, column_index
+from app.models.gsheet_model import (
+    ColSheetModel,
+    Product,
+    G2G,
+    FUN,
+    BIJ,
+    DD,
+    PriceSheet1,
+    PriceSheet2,
+    PriceSheet3,
+    PriceSheet4,
+)
+from app.utils.sheets_limiter import SHEETS_READ, sheets_call
+from app.utils.stock_fake import Row
+
+T = TypeVar("T", bound=ColSheetModel)
+
+SNAPSHOT_MODELS: Final[tuple[Type[ColSheetModel], ...]] = (
+    Product, G2G, FUN, BIJ, DD, PriceSheet1, PriceSheet2, PriceSheet3, PriceSheet4,
+)
+# Columns of every model, B:CR today
+SNAPSHOT_RANGE_PLAN: Final[RangePlan] = RangePlan.for_plans(
+    model_cls.column_plan() for model_cls in SNAPSHOT_MODELS
+)
+
+
+def is_run_value(value: Any) -> bool:
+    if isinstance(value, int):
+        return value == 1
+    if isinstance(value, str):
+        try:
+            return int(value) == 1
+        except Exception:
+            return False
+    return False
+
+
+class SheetSnapshot:
+    """
+    Every row of the model columns read in one request, using the
+    contiguous spans of SNAPSHOT_RANGE_PLAN, and decoded into the sheet
+    models from memory.
+    """
+
+    def __init__(
+        self,
+        worksheet: gspread.worksheet.Worksheet,
+        values: list[list[Any]],
+    ) -> None:
+        self.worksheet = worksheet
+        self.values = values
+        self._first_col_index = SNAPSHOT_RANGE_PLAN.first_col_index
+
+    @classmethod
+    def load(
+        cls,
+        worksheet: gspread.worksheet.Worksheet,
+    ) -> "SheetSnapshot":
+        query_results = sheets_call(SHEETS_READ, worksheet.batch_get, SNAPSHOT_RANGE_PLAN.ranges())
+        return cls(worksheet, SNAPSHOT_RANGE_PLAN.assemble(query_results))
+
+    def run_indexes(self) -> list[int]:
+        check_col = Product.mapping_fields()["CHECK"]
+        return [
+            index
+            for index in range(1, len(self.values) + 1)
+            if is_run_value(self.cell(check_col, index))
+        ]
+
+    def cell(
+        self,
+        col_letter: str,
+        index: int,
+    ) -> Any:
+        if index < 1 or index > len(self.values):
+            return None
+        row_values = self.values[index - 1]
+        position = column_index(col_letter) - self._first_col_index
+        if position < 0 or position >= len(row_values):
+            return None
+
+        return clean_cell(row_values[position])
+
+    def model(
+        self,
+        model_cls: Type[T],
+        index: int,
+    ) -> T:
+        row_values = self.values[index - 1] if 1 <= index <= len(self.values) else []
+        return model_cls.from_row_values(self.worksheet, index, row_values, self._first_col_index)
+
+    def product(
+        self,
+        index: int,
+    ) -> Product:
+        return self.model(Product, index)
+
+    def row(
+        self,
+        index: int,
+    ) -> Row:
+        return Row(
+            row_index=index,
+            g2g=self.model(G2G, index),
+            fun=self.model(FUN, index),
+            bij=self.model(BIJ, index),
+            dd=self.model(DD, index),
+            s1=self.model(PriceSheet1, index),
+            s2=self.model(PriceSheet2, index),
+            s3=self.model(PriceSheet3, index),
+            s4=self.model(PriceSheet4, index),
+        )
+
+    def sheet_refs(
+        self,
+        indexes: list[int],
+    ) -> list[tuple[str, str]]:
+        """
+        External cell references read by the rows of indexes, the order
+        site models only of the rows running a compare flow.
+        """
+        refs = []
+        for index in indexes:
+            try:
+                product = self.product(index)
+                refs.extend(product.sheet_refs())
+                if product.CHECK_PRODUCT_COMPARE in (1, 2):
+                    row = self.row(index)
+                    for model in (row.g2g, row.fun, row.bij, row.s1, row.s2, row.s3, row.s4):
+                        refs.extend(model.sheet_refs())
+            except ValidationError:
+                # The row reports its own validation error when it runs
+                continue
+        return refs
@@ -0,0 +1,225 @@
+import functools
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Final, TypeVar
+
+from app.utils.host_limiter import SHEETS_HOST, host_slot
+
+T = TypeVar("T")
+
+SHEETS_READ: Final[str] = "read"
+SHEETS_WRITE: Final[str] = "write"
+
+# Requests per minute of the Sheets API per user, the quota is 60 per kind
+DEFAULT_SHEETS_BUDGETS: Final[dict[str, int]] = {
+    SHEETS_READ: 55,
+    SHEETS_WRITE: 55,
+}
+
+THROTTLED_STATUS_CODE: Final[int] = 429
+# Backoff of a 429 without Retry-After, doubled on every 429 in a row
+MIN_BACKOFF: Final[float] = 2.0
+MAX_BACKOFF: Final[float] = 64.0
+# Rate kept after a 429, as a fraction of the budget, and regained per call
+THROTTLED_RATE_FACTOR: Final[float] = 0.5
+RATE_RECOVERY_STEP: Final[float] = 0.05
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket which halves its rate on a 429 and regains it
+    call by call.
+    """
+
+    def __init__(
+        self,
+        per_minute: float,
+        burst: int,
+    ) -> None:
+        self.max_rate = per_minute / 60
+        self.rate = self.max_rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._backoff = MIN_BACKOFF
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take a token, waiting for it if needed.
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+
+            time.sleep(wait)
+            waited += wait
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_RECOVERY_STEP)
+            self._backoff = MIN_BACKOFF
+
+    def on_throttled(
+        self,
+        retry_after: float | None,
+    ) -> float:
+        """
+        Pause the bucket after a 429 and lower its rate.
+
+        Returns:
+            Seconds the bucket is paused for
+        """
+        with self._lock:
+            pause = retry_after if retry_after is not None else self._backoff
+            self._backoff = min(MAX_BACKOFF, self._backoff * 2)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self.rate = max(self.max_rate * 0.1, self.rate * THROTTLED_RATE_FACTOR)
+            self._tokens = 0.0
+            return pause
+
+
+class SheetsLimiterStats:
+    def __init__(self) -> None:
+        self._counts: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        kind: str,
+        calls: int = 0,
+        throttled: int = 0,
+        waited: float = 0.0,
+    ) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(kind, [0, 0, 0.0])
+            counts[0] += calls
+            counts[1] += throttled
+            counts[2] += waited
+
+    def as_dict(self) -> dict[str, tuple[int, int, float]]:
+        with self._lock:
+            return {k: (int(v[0]), int(v[1]), v[2]) for k, v in self._counts.items()}
+
+    def __str__(self) -> str:
+        return "Sheets limiter stats: " + ", ".join(
+            f"{kind} calls={calls} throttled={throttled} waited={waited:.1f}s"
+            for kind, (calls, throttled, waited) in sorted(self.as_dict().items())
+        )
+
+
+sheets_limiter_stats = SheetsLimiterStats()
+
+_buckets: dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def sheets_bucket(kind: str) -> TokenBucket:
+    with _buckets_lock:
+        if kind not in _buckets:
+            per_minute = int(
+                os.getenv(f"SHEETS_{kind.upper()}_PER_MINUTE", DEFAULT_SHEETS_BUDGETS[kind])
+            )
+            burst = int(os.getenv("SHEETS_BURST", "5"))
+            _buckets[kind] = TokenBucket(per_minute, burst)
+        return _buckets[kind]
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Seconds to wait from a Retry-After header, given in seconds or as an
+    HTTP date
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def throttled_retry_after(error: Exception) -> tuple[bool, float | None]:
+    """
+    Whether error is a Sheets 429, and its Retry-After in seconds.
+
+    gspread raises APIError holding a requests response, googleapiclient
+    raises HttpError holding an httplib2 response.
+    """
+    response = getattr(error, "response", None)
+    if response is not None and getattr(response, "status_code", None) == THROTTLED_STATUS_CODE:
+        return True, parse_retry_after(response.headers.get("Retry-After"))
+
+    resp = getattr(error, "resp", None)
+    if resp is not None and getattr(resp, "status", None) == THROTTLED_STATUS_CODE:
+        return True, parse_retry_after(resp.get("retry-after"))
+
+    return False, None
+
+
+def sheets_call(
+    kind: str,
+    func: Callable[..., T],
+    *args: Any,
+    **kwargs: Any,
+) -> T:
+    """
+    Call a Sheets request within the read or write budget, retrying it
+    SHEETS_THROTTLE_RETRIES times when it is throttled with a 429
+    """
+    bucket = sheets_bucket(kind)
+    max_retries = int(os.getenv("SHEETS_THROTTLE_RETRIES", "3"))
+    attempt = 0
+    while True:
+        waited = bucket.acquire()
+        sheets_limiter_stats.record(kind, calls=1, waited=waited)
+        try:
+            with host_slot(SHEETS_HOST):
+                result = func(*args, **kwargs)
+        except Exception as e:
+            is_throttled, retry_after = throttled_retry_after(e)
+            if not is_throttled:
+                raise
+            pause = bucket.on_throttled(retry_after)
+            sheets_limiter_stats.record(kind, throttled=1)
+            print(f"Sheets {kind} throttled, pause for {pause:.1f}s")
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            continue
+
+        bucket.on_success()
+        return result
+
+
+def limit_sheets(kind: str):
+    """
+    Decorator form of sheets_call
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return sheets_call(kind, func, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,5 +1,5 @@
 import concurrent.futures
-import os
+import functools
 import re
 from enum import Enum
 from typing import Optional, Tuple, List, TypeVar, Type, Any
@@ -10,16 +10,19 @@ from pydantic import BaseModel, ValidationError
 from app.decorator.retry import retry
 from app.decorator.time_execution import time_execution
 from app.models.crwl_api_models import Product
-from app.models.gsheet_model import G2G, BIJ, FUN, DD, PriceSheet1, PriceSheet2, PriceSheet3, PriceSheet4
+from app.models.column_plan import RangePlan
+from app.models.gsheet_model import (
+    G2G, BIJ, FUN, DD, PriceSheet1, PriceSheet2, PriceSheet3, PriceSheet4, read_plan_rows,
+)
 from app.utils.biji_extract import bij_lowest_price
 from app.utils.common_utils import getCNYRate
 from app.utils.dd_utils import get_dd_min_price
+from app.utils.exchange_rate import USD_IDR_RATE, exchange_rates
 from app.utils.fun_extract import fun_extract_offer_items, FUNOfferItem
 from app.utils.g2g_extract import g2g_extract_offer_items, G2GOfferItem
 from app.utils.ggsheet import (
     GSheet,
 )
-from app.utils.google_api import StockManager
 
 
 class ExtraInfor:
@@ -499,15 +502,7 @@ def calculate_price_stock_fake(
     s3_min_price_usd = results.get('s3')
     s4_min_price_usd = results.get('s4')
     # convert all this price if not None from usd to idr
-    try:
-        RATE_SHEET_ID = os.getenv("RATE_SHEET_ID")
-        RATE_SHEET_NAME = os.getenv("RATE_SHEET_NAME")
-        CELL_RATE_USD = os.getenv("CELL_RATE_USD")
-        rate_sheet = StockManager(RATE_SHEET_ID)
-        rate = rate_sheet.get_cell_float_value(f"'{RATE_SHEET_NAME}'!{CELL_RATE_USD}")
-    except Exception:
-        print("Error fetching exchange rate from Google Sheet, using default rate 16326.")
-        rate = 16326
+    rate = exchange_rates.get(USD_IDR_RATE)
     print(f"Exchange rate used: {rate} IDR/USD")
     g2g_min_price = convert_usd_to_idr(g2g_min_price_usd, rate)
     fun_min_price = convert_usd_to_idr(fun_min_price_usd, rate)
@@ -610,66 +605,27 @@ def _get_models_from_row(
     """
     (Hàm nội bộ) Lấy dữ liệu cho nhiều model Pydantic từ một dòng duy nhất.
     """
-    all_ranges = []
-    model_field_info = []
-
-    # --- Bước 1: Tổng hợp tất cả các ô cần lấy từ tất cả các model ---
-    for model_cls in model_classes:
-        mapping = model_cls.mapping_fields()
-        if not mapping:
-            continue
-
-        field_names = list(mapping.keys())
-        model_field_info.append({'class': model_cls, 'fields': field_names})
-
-        for col_letter in mapping.values():
-            all_ranges.append(f"{col_letter}{row_index}")
-
-    if not all_ranges:
+    model_classes = [model_cls for model_cls in model_classes if model_cls.column_plan().fields]
+    if not model_classes:
         return []
 
+    # --- Bước 1: Gộp các cột liền nhau của tất cả model thành các span (AA5:CR5) ---
+    range_plan = _combined_range_plan(tuple(model_classes))
+
     # --- Bước 2: Thực hiện một lệnh batch_get duy nhất ---
     try:
-        # `batch_get` trả về một danh sách các ma trận giá trị.
-        # Ví dụ: [['A1_val']], [['B1_val']], [[]] (cho ô trống)
-        query_results = worksheet.batch_get(all_ranges)
+        row_values = read_plan_rows(worksheet, range_plan, row_index)[0]
     except Exception as e:
         raise ValueError(f"Lỗi khi thực hiện batch_get từ Google Sheet: {e}")
 
-    # --- FIX HERE: Xử lý đúng cấu trúc dữ liệu trả về ---
-    all_values = []
-    for value_matrix in query_results:
-        value = None
-        # Kiểm tra xem ma trận và dòng đầu tiên có tồn tại và có nội dung không
-        if value_matrix and value_matrix[0]:
-            value = value_matrix[0][0]
-
-        # Xử lý chuỗi
-        if isinstance(value, str):
-            value = value.strip()
-            # Coi chuỗi rỗng là None để nhất quán với ô trống
-            if not value:
-                value = None
-
-        all_values.append(value)
-
-    # --- Bước 3: Phân phối giá trị và khởi tạo các model ---
+    # --- Bước 3: Cắt giá trị theo từng field và khởi tạo các model ---
     validated_models = []
-    current_position = 0
-
-    for info in model_field_info:
-        model_cls = info['class']
-        field_names = info['fields']
-        num_fields = len(field_names)
-
-        model_values = all_values[current_position: current_position + num_fields]
-        model_dict = dict(zip(field_names, model_values))
-
-        model_dict["worksheet"] = worksheet
-        model_dict["index"] = row_index
 
+    for model_cls in model_classes:
         try:
-            validated_model = model_cls.model_validate(model_dict)
+            validated_model = model_cls.from_row_values(
+                worksheet, row_index, row_values, range_plan.first_col_index
+            )
             validated_models.append(validated_model)
         except ValidationError as e:
             error_details = e.errors()
@@ -678,6 +634,9 @@ def _get_models_from_row(
                 model=model_cls
             ) from e
 
-        current_position += num_fields
-
     return validated_models
+
+
+@functools.cache
+def _combined_range_plan(model_classes: Tuple[Type[T], ...]) -> RangePlan:
+    return RangePlan.for_plans(model_cls.column_plan() for model_cls in model_classes)
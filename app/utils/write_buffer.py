@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from typing import Any
+
+import gspread
+
+from app.utils.decorators import retry_on_fail
+from app.utils.sheets_limiter import SHEETS_WRITE, sheets_call
+
+
+class SheetWriteBuffer:
+    """
+    Collect cell updates of a worksheet and write them with as few
+    batch_update calls as possible.
+
+    A later update of the same range replaces the pending one. The buffer is
+    flushed when it holds WRITE_BUFFER_SIZE ranges, when its oldest update is
+    WRITE_BUFFER_MAX_AGE seconds old and when it is closed.
+    """
+
+    def __init__(
+        self,
+        worksheet: gspread.worksheet.Worksheet,
+        max_size: int | None = None,
+        max_age: float | None = None,
+    ) -> None:
+        self.worksheet = worksheet
+        self.max_size = max_size or int(os.getenv("WRITE_BUFFER_SIZE", "50"))
+        self.max_age = max_age or float(os.getenv("WRITE_BUFFER_MAX_AGE", "30"))
+        self._pending: dict[str, Any] = {}
+        self._oldest: float | None = None
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "SheetWriteBuffer":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.flush()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def add(
+        self,
+        updates: list[dict],
+    ) -> None:
+        """
+        Queue batch_update style updates: [{"range": "D5", "values": [[...]]}]
+        """
+        with self._lock:
+            for update in updates:
+                self._pending[update["range"]] = update["values"]
+            if self._oldest is None and self._pending:
+                self._oldest = time.monotonic()
+
+        self.flush_if_due()
+
+    def flush_if_due(self) -> None:
+        with self._lock:
+            is_due = len(self._pending) >= self.max_size or (
+                self._oldest is not None
+                and time.monotonic() - self._oldest >= self.max_age
+            )
+        if is_due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._oldest = None
+
+        if not pending:
+            return
+
+        try:
+            self._batch_update(
+                [{"range": k, "values": v} for k, v in pending.items()]
+            )
+            print(f"Flushed {len(pending)} sheet updates")
+        except Exception as e:
+            print(f"Failed to flush {len(pending)} sheet updates: {e}")
+            # Keep the failed updates for the next flush, unless a newer
+            # update of the same range was queued meanwhile
+            with self._lock:
+                for k, v in pending.items():
+                    self._pending.setdefault(k, v)
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+
+    @retry_on_fail(max_retries=3, sleep_interval=5)
+    def _batch_update(
+        self,
+        updates: list[dict],
+    ) -> None:
+        sheets_call(SHEETS_WRITE, self.worksheet.batch_update, updates)
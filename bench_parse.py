@@ -0,0 +1,124 @@
+"""
+Micro-benchmark of the CrwlAPI.product listing parsing: the old res.json() +
+model_validate of the full models against model_validate_json of the raw
+bytes into the slim models.
+
+No payload is committed. Record the cheapest-first 201-item page of one or
+more compare urls (PRODUCT_COMPARE cells) into storage/crwl_payloads/ with
+setting.env loaded:
+    python bench_parse.py --record https://itemku.com/g/...
+
+The query params of a url come from the crawl params cache, or else from
+the page fetched over HTTP. Then benchmark the recorded payloads, or the
+given files:
+    python bench_parse.py [payload.json ...]
+"""
+import argparse
+import json
+import time
+import timeit
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+from app.models.crwl_api_models import CrwlAPIRes
+
+PAYLOADS_PATH = Path("storage/crwl_payloads")
+
+
+class LegacySeller(BaseModel):
+    id: int
+    shop_name: str
+
+
+class LegacyProduct(BaseModel):
+    id: int
+    name: str
+    min_order: int
+    price: int
+    server_name: str | None = None
+    stock: int
+    base_unit: int
+    seller: LegacySeller
+
+
+class LegacyData(BaseModel):
+    total_item: int
+    item_per_page: int
+    current_page: int
+    data: list[LegacyProduct]
+    metadata: list
+
+
+class LegacyCrwlAPIRes(BaseModel):
+    success: bool
+    data: LegacyData
+    message: str
+    statusCode: str
+
+
+def parse_old(content: bytes) -> LegacyCrwlAPIRes:
+    return LegacyCrwlAPIRes.model_validate(json.loads(content))
+
+
+def parse_new(content: bytes) -> CrwlAPIRes:
+    return CrwlAPIRes.model_validate_json(content)
+
+
+def record(urls: list[str]) -> None:
+    from app.processes.crwl import find_next_data_text, find_query_params, parse_next_data
+    from app.processes.crwl_api import crwl_api
+    from app.processes.crwl_fetch import fetch_page_source
+    from app.processes.crwl_params_cache import crwl_params_cache
+
+    PAYLOADS_PATH.mkdir(parents=True, exist_ok=True)
+    for url in urls:
+        params = crwl_params_cache.get(url)
+        if params is None:
+            page_source = fetch_page_source(url)
+            next_data_text = find_next_data_text(page_source) if page_source is not None else None
+            if next_data_text is None:
+                print(f"Can't resolve the query params of {url}, run a round with it first")
+                continue
+            params = find_query_params(parse_next_data(next_data_text))
+        content = crwl_api.product_content(**params.model_dump())
+        path = PAYLOADS_PATH.joinpath(f"{params.game_id}_{int(time.time() * 1000)}.json")
+        path.write_bytes(content)
+        print(f"Recorded {len(parse_new(content).data.data)} items of {url} to {path}")
+
+
+def bench(paths: list[Path], number: int) -> None:
+    for path in paths:
+        content = path.read_bytes()
+        items = len(parse_new(content).data.data)
+        old_time = min(timeit.repeat(lambda: parse_old(content), number=number, repeat=5)) / number
+        new_time = min(timeit.repeat(lambda: parse_new(content), number=number, repeat=5)) / number
+        print(
+            f"{path.name}: {items} items, {len(content)} bytes, "
+            f"old {old_time * 1000:.3f} ms, new {new_time * 1000:.3f} ms, "
+            f"x{old_time / new_time:.2f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the product listing parsing")
+    parser.add_argument("payloads", nargs="*", type=Path, help="Recorded payload files")
+    parser.add_argument("--record", nargs="+", metavar="URL", help="Record the payloads of compare urls")
+    parser.add_argument("--number", type=int, default=200, help="Parses per timing")
+    args = parser.parse_args()
+
+    if args.record:
+        load_dotenv("setting.env")
+        record(args.record)
+        return
+
+    paths = args.payloads or sorted(PAYLOADS_PATH.glob("*.json"))
+    if not paths:
+        print(f"No payloads, record some with --record URL or put them in {PAYLOADS_PATH}")
+        return
+    bench(paths, args.number)
+
+
+if __name__ == "__main__":
+    main()
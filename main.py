@@ -1,90 +1,175 @@
+import concurrent.futures
 import os
+import threading
 
 from datetime import datetime
 import time
 
 from dotenv import load_dotenv
-from gspread.worksheet import Worksheet
-from seleniumbase import SB
 
 
 from app.utils.gsheet import worksheet
 from app.models.gsheet_model import Product
 from app.main_process import process
+from app.processes.competitor_cache import competitor_cache
+from app.processes.crwl_fetch import crwl_fetch_stats
 from pydantic import ValidationError
+from app.utils.browser_pool import BrowserPool
+from app.utils.exchange_rate import exchange_rates
+from app.utils.google_api import sheet_ref_resolver
+from app.utils.scheduler import RowScheduler
+from app.utils.sheets_limiter import SHEETS_WRITE, sheets_call, sheets_limiter_stats
+from app.utils.sheet_snapshot import SheetSnapshot
 from app.utils.update_messages import last_update_message
+from app.utils.write_buffer import SheetWriteBuffer
 
-def get_run_indexes(sheet: Worksheet) -> list[int]:
-    run_indexes = []
-    check_col = sheet.col_values(2)
-    for idx, value in enumerate(check_col):
-        idx += 1
-        if isinstance(value, int):
-            if value == 1:
-                run_indexes.append(idx)
-        if isinstance(value, str):
-            try:
-                int_value = int(value)
-            except Exception:
-                continue
-            if int_value == 1:
-                run_indexes.append(idx)
+# Monotonic time after which a row may run again, used by the worker-pool mode
+# so RELAX_TIME only holds back its own row
+_row_cooldowns: dict[int, float] = {}
+_row_cooldowns_lock = threading.Lock()
+
+
+def _report_row_error(
+        index: int,
+        message: str,
+        write_buffer: SheetWriteBuffer | None = None,
+) -> None:
+    now = datetime.now()
+    update_batch = [
+        {
+            "range": f"D{index}",
+            "values": [[f"{last_update_message(now)}: {message}"]],
+        }
+    ]
+    if write_buffer is not None:
+        write_buffer.add(update_batch)
+        return
+
+    try:
+        sheets_call(SHEETS_WRITE, worksheet.batch_update, update_batch)
+    except Exception as e:
+        print(e)
+        time.sleep(10)
 
-    return run_indexes
+
+def process_row(
+        sb,
+        index: int,
+        snapshot: SheetSnapshot | None = None,
+        write_buffer: SheetWriteBuffer | None = None,
+) -> int | None:
+    """
+    Run one sheet row and report failures to its Note column.
+
+    Args:
+        sb: Browser used to crawl the compare page
+        index: Sheet row index
+        snapshot: Round snapshot to decode the row from, the row is read from
+            the sheet when it is not given
+        write_buffer: Round write buffer for the Note/Last_update cells, they
+            are written right away when it is not given
+
+    Returns:
+        The RELAX_TIME of the row, or None if the row could not be read
+    """
+    print(f"INDEX (ROW): {index}")
+    try:
+        if snapshot is None:
+            product = Product.get(worksheet, index)
+            row = None
+        else:
+            product = snapshot.product(index)
+            # Order site columns are only read by the compare flows
+            row = snapshot.row(index) if product.CHECK_PRODUCT_COMPARE in (1, 2) else None
+
+        product.bind_write_buffer(write_buffer)
+        process(sb, product, index, row)
+        return product.RELAX_TIME
+    except ValidationError as e:
+        print(f"VALIDATION ERROR AT ROW: {index}")
+        print(e.errors())
+        _report_row_error(index, f"VALIDATION ERROR AT ROW: {index}", write_buffer)
+
+    except Exception as e:
+        print(f"FAILED AT ROW: {index}")
+        print(e)
+        _report_row_error(index, f"FAILED: {e}", write_buffer)
+
+    return None
+
+
+def _process_row_with_cooldown(
+        sb,
+        index: int,
+        snapshot: SheetSnapshot,
+        write_buffer: SheetWriteBuffer,
+) -> None:
+    relax_time = process_row(sb, index, snapshot, write_buffer)
+    if relax_time:
+        with _row_cooldowns_lock:
+            _row_cooldowns[index] = time.monotonic() + relax_time
+
+
+def main_pool(sb, workers: int):
+    competitor_cache.new_round()
+    snapshot = SheetSnapshot.load(worksheet)
+    run_indexes = snapshot.run_indexes()
+    now = time.monotonic()
+    with _row_cooldowns_lock:
+        ready_indexes = [
+            index for index in run_indexes if _row_cooldowns.get(index, 0) <= now
+        ]
+    print(f"Run index: {ready_indexes} ({len(run_indexes) - len(ready_indexes)} rows cooling down)")
+    # Rows still waiting for a worker after SHEET_REFS_MAX_AGE read their
+    # refs again, so min/max prices and stock are never older than that
+    sheet_ref_resolver.prefetch(snapshot.sheet_refs(ready_indexes))
+
+    try:
+        with (
+            SheetWriteBuffer(worksheet) as write_buffer,
+            concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor,
+        ):
+            futures = [
+                executor.submit(_process_row_with_cooldown, sb, index, snapshot, write_buffer)
+                for index in ready_indexes
+            ]
+            concurrent.futures.wait(futures)
+    finally:
+        sheet_ref_resolver.clear()
 
 
 def main(sb):
-    load_dotenv("setting.env")
-    run_indexes = get_run_indexes(worksheet)
+    competitor_cache.new_round()
+    snapshot = SheetSnapshot.load(worksheet)
+    run_indexes = snapshot.run_indexes()
     print(f"Run index: {run_indexes}")
-    for index in run_indexes:
-        print(f"INDEX (ROW): {index}")
-        try:
-            product = Product.get(worksheet, index)
+    try:
+        with SheetWriteBuffer(worksheet) as write_buffer:
+            for index in run_indexes:
+                # The rows sleep between each other, so the refs of each row
+                # are read right before it runs
+                sheet_ref_resolver.prefetch(snapshot.sheet_refs([index]))
+                relax_time = process_row(sb, index, snapshot, write_buffer)
+                if relax_time is not None:
+                    print(f"Sleep for {relax_time}s")
+                    time.sleep(relax_time)
 
-            process(sb, product, index)
-            print(f"Sleep for {product.RELAX_TIME}s")
-            time.sleep(product.RELAX_TIME)
-        except ValidationError as e:
-            print(f"VALIDATION ERROR AT ROW: {index}")
-            print(e.errors())
-            try:
-                now = datetime.now()
-                worksheet.batch_update(
-                    [
-                        {
-                            "range": f"D{index}",
-                            "values": [
-                                [
-                                    f"{last_update_message(now)}: VALIDATION ERROR AT ROW: {index}"
-                                ]
-                            ],
-                        }
-                    ]
-                )
-            except Exception as e:
-                print(e)
-                time.sleep(10)
-
-        except Exception as e:
-            print(f"FAILED AT ROW: {index}")
-            print(e)
-            try:
-                now = datetime.now()
-                worksheet.batch_update(
-                    [
-                        {
-                            "range": f"D{index}",
-                            "values": [[f"{last_update_message(now)}: FAILED: {e}"]],
-                        }
-                    ]
-                )
-            except Exception as e1:
-                print(e1)
-                time.sleep(10)
+                time.sleep(4)
+    finally:
+        sheet_ref_resolver.clear()
 
-        time.sleep(4)
 
+def run_round(sb):
+    load_dotenv("setting.env")
+    workers = int(os.getenv("ROW_WORKERS", "1"))
+    if workers > 1:
+        main_pool(sb, workers)
+    else:
+        main(sb)
+
+    print(crwl_fetch_stats)
+    print(sheets_limiter_stats)
+    print(competitor_cache)
     print(f"Sleep for {os.getenv('RELAX_TIME_EACH_ROUND', '10')}s")
     time.sleep(
         int(
@@ -96,11 +181,88 @@ def main(sb):
     )
 
 
+def run_scheduler(sb):
+    """
+    Keep every enabled row on a deadline queue and run the most overdue rows
+    as soon as a worker is free. RELAX_TIME is the delay before a row is due
+    again and RELAX_TIME_EACH_ROUND is how often enabled rows are re-synced.
+    """
+    scheduler = RowScheduler()
+    running: dict[concurrent.futures.Future, int] = {}
+    snapshot: SheetSnapshot | None = None
+    next_sync = 0.0
+    workers = int(os.getenv("ROW_WORKERS", "1"))
+
+    with (
+        SheetWriteBuffer(worksheet) as write_buffer,
+        concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor,
+    ):
+        while True:
+            load_dotenv("setting.env")
+            sync_interval = int(os.getenv("RELAX_TIME_EACH_ROUND", "10"))
+            retry_delay = int(os.getenv("ROW_RETRY_DELAY", "60"))
+            # The sequential rounds wait 4s after every row, a RELAX_TIME of 0
+            # must not run a row back-to-back either
+            min_delay = float(os.getenv("ROW_MIN_DELAY", "4"))
+
+            write_buffer.flush_if_due()
+            if time.monotonic() >= next_sync:
+                write_buffer.flush()
+                snapshot = SheetSnapshot.load(worksheet)
+                run_indexes = snapshot.run_indexes()
+                scheduler.sync(run_indexes)
+                next_sync = time.monotonic() + sync_interval
+                print(scheduler.stats())
+                print(crwl_fetch_stats)
+                print(sheets_limiter_stats)
+                print(competitor_cache)
+                competitor_cache.new_round()
+
+            due_indexes = []
+            while len(running) + len(due_indexes) < workers:
+                index = scheduler.pop_next()
+                if index is None:
+                    break
+                due_indexes.append(index)
+            if due_indexes:
+                # Only the refs of the rows about to run are read
+                sheet_ref_resolver.prefetch(snapshot.sheet_refs(due_indexes))
+            for index in due_indexes:
+                running[executor.submit(process_row, sb, index, snapshot, write_buffer)] = index
+
+            if not running:
+                next_due_in = scheduler.next_due_in()
+                wait_time = max(0.0, next_sync - time.monotonic())
+                if next_due_in is not None:
+                    wait_time = min(wait_time, next_due_in)
+                time.sleep(wait_time)
+                continue
+
+            done, _ = concurrent.futures.wait(
+                running,
+                timeout=max(0.0, next_sync - time.monotonic()),
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                index = running.pop(future)
+                relax_time = future.result()
+                scheduler.reschedule(
+                    index, max(relax_time if relax_time is not None else retry_delay, min_delay)
+                )
+
+
+load_dotenv("setting.env")
+exchange_rates.start()
+
 while True:
     try:
-        with SB(headless=True, uc=True) as sb:
-            url = "https://www.itemku.com/"
-            sb.activate_cdp_mode(url)
-            main(sb)
+        load_dotenv("setting.env")
+        # Workers lease browsers from the pool, a bad page only costs its
+        # lease instead of restarting the browser for every row
+        with BrowserPool() as browser_pool:
+            if os.getenv("ROW_SCHEDULER", "0") == "1":
+                run_scheduler(browser_pool)
+            else:
+                run_round(browser_pool)
     except Exception:
         time.sleep(30)
@@ -0,0 +1,29 @@
+import pytest
+
+from app.models.column_plan import ColumnPlan, RangePlan, clean_cell
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        # An empty cell is not returned by a single cell read
+        ("", None),
+        (None, None),
+        # A whitespace-only cell is returned and stripped to ""
+        ("  ", ""),
+        (" gold ", "gold"),
+        (5, 5),
+    ],
+)
+def test_clean_cell(value, expected):
+    assert clean_cell(value) == expected
+
+
+def test_decode_spans():
+    plan = ColumnPlan.compile({"a": "B", "b": "C", "c": "E"}, {"c"})
+    range_plan = RangePlan.for_plans([plan])
+    assert range_plan.ranges(3) == ["B3:C3", "E3:E3"]
+
+    # The second span was not returned, trailing cells are missing
+    rows = range_plan.assemble([[[" x ", "  "]], []], 1)
+    assert plan.decode(rows[0], range_plan.first_col_index) == {"a": "x", "b": "", "c": None}
@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from app.models.crwl_api_models import Product, Seller
+from app.processes.competitor_columns import CompetitorColumns, columnar_enabled, competitor_stats
+from app.processes.competitor_matcher import CompetitorMatcher
+
+
+def make_product(
+        price: int,
+        shop_name: str,
+) -> Product:
+    return Product(
+        name="Gold",
+        min_order=1,
+        price=price,
+        server_name="Asia",
+        stock=1,
+        seller=Seller(shop_name=shop_name),
+    )
+
+
+def random_cases(count: int = 500):
+    rng = random.Random(0)
+    for _ in range(count):
+        products = [
+            make_product(rng.randint(0, 30), rng.choice("abc"))
+            for _ in range(rng.randint(0, 25))
+        ]
+        keyword_mask = [rng.random() < 0.7 for _ in products]
+        min_price = rng.randint(0, 15)
+        max_price = rng.choice([None, 0, rng.randint(min_price, 30)])
+        yield products, keyword_mask, min_price, max_price
+
+
+def test_columnar_is_opt_in(monkeypatch):
+    monkeypatch.delenv("CRWL_COLUMNAR", raising=False)
+    assert not columnar_enabled()
+    monkeypatch.setenv("CRWL_COLUMNAR", "1")
+    assert columnar_enabled()
+
+
+def test_columns_match_python():
+    for products, keyword_mask, min_price, max_price in random_cases():
+        matcher = CompetitorMatcher(None, None, frozenset(), min_price, max_price)
+        columns = CompetitorColumns(products, keyword_mask)
+
+        valid_keywords_products = [p for p, is_valid in zip(products, keyword_mask) if is_valid]
+        valid_products = [p for p in valid_keywords_products if matcher.is_price_valid(p.price)]
+        min_price_product = None
+        for product in valid_products:
+            if min_price_product is None or product.price < min_price_product.price:
+                min_price_product = product
+
+        price_mask = columns.price_mask(min_price, max_price)
+        assert columns.select(price_mask) == valid_products
+        assert columns.argmin(price_mask) is min_price_product
+
+        target_price = random.Random(len(products)).randint(0, 30)
+        assert columns.cheaper_than(target_price) == [
+            p for p in valid_keywords_products if p.price < target_price
+        ]
+
+        assert columns.stats(min_price, max_price) == competitor_stats(
+            valid_keywords_products, valid_products, min_price
+        )
+
+
+def test_match_columns_same_as_python(monkeypatch):
+    for products, keyword_mask, min_price, max_price in random_cases():
+        matcher = CompetitorMatcher(None, None, frozenset(), min_price, max_price)
+
+        monkeypatch.setenv("CRWL_COLUMNAR", "0")
+        python_match = matcher.match_keyword_mask(products, keyword_mask)
+        monkeypatch.setenv("CRWL_COLUMNAR", "1")
+        columnar_match = matcher.match_keyword_mask(products, keyword_mask)
+
+        assert python_match.columns is None
+        assert columnar_match.columns is not None
+        assert columnar_match == python_match
+        assert columnar_match.cheaper_than(min_price + 5) == python_match.cheaper_than(min_price + 5)
+        assert columnar_match.stats() == python_match.stats()
@@ -0,0 +1,254 @@
+import random
+
+import pytest
+
+from app.models.crwl_api_models import CrwlAPIRes, Data, Product, Seller
+from app.processes.competitor_matcher import CompetitorMatcher, compile_keyword_filter
+from app.shared.consts import KEYWORD_SPLIT_BY_CHARACTER
+
+
+@pytest.fixture(autouse=True, params=["0", "1"], ids=["python", "columnar"])
+def columnar(request, monkeypatch):
+    """
+    Run every test with the Python matcher and with the NumPy columns
+    """
+    if request.param == "1":
+        pytest.importorskip("numpy")
+    monkeypatch.setenv("CRWL_COLUMNAR", request.param)
+    return request.param
+
+
+def make_product(
+        name: str = "Gold",
+        server_name: str | None = "Asia",
+        price: int = 100,
+        shop_name: str = "shop",
+) -> Product:
+    return Product(
+        name=name,
+        min_order=1,
+        price=price,
+        server_name=server_name,
+        stock=1,
+        seller=Seller(shop_name=shop_name),
+    )
+
+
+def legacy_match(
+        products: list[Product],
+        include_keyword: str | None,
+        exclude_keyword: str | None,
+        blacklist,
+        min_price: int,
+        max_price: int | None,
+):
+    """
+    The inline filter of the compare flows before CompetitorMatcher
+    """
+    valid_products = []
+    valid_keywords_products = []
+    min_price_product = None
+
+    for _product in products:
+        if _product.seller.shop_name not in blacklist:
+            if (
+                    (
+                            include_keyword
+                            and all(
+                        (
+                                keyword.lower()
+                                in _product.name.lower() + _product.server_name.lower()
+                                if _product.server_name
+                                else ""
+                        )
+                        for keyword in include_keyword.split(KEYWORD_SPLIT_BY_CHARACTER)
+                    )
+                    )
+                    or include_keyword is None
+            ) and (
+                    exclude_keyword
+                    and not any(
+                (
+                        keyword.lower()
+                        in _product.name.lower() + _product.server_name.lower()
+                        if _product.server_name
+                        else ""
+                )
+                for keyword in exclude_keyword.split(KEYWORD_SPLIT_BY_CHARACTER)
+            )
+                    or exclude_keyword is None
+            ):
+                valid_keywords_products.append(_product)
+                if (max_price and min_price <= _product.price <= max_price) or (
+                        max_price is None and min_price <= _product.price
+                ):
+                    valid_products.append(_product)
+                    if min_price_product is None or _product.price < min_price_product.price:
+                        min_price_product = _product
+
+    return valid_keywords_products, valid_products, min_price_product
+
+
+@pytest.mark.parametrize(
+    "include_keyword, exclude_keyword, name, server_name, expected",
+    [
+        # Unset filters always pass
+        (None, None, "Gold", "Asia", True),
+        (None, None, "Gold", None, True),
+        # A missing server_name fails a set include filter but passes exclude
+        ("gold", None, "Gold", None, False),
+        (None, "gold", "Gold", None, True),
+        (None, "gold", "Gold", "", True),
+        # An empty filter string never passes
+        ("", None, "Gold", "Asia", False),
+        (None, "", "Gold", "Asia", False),
+        ("", None, "Gold", None, False),
+        (None, "", "Gold", None, False),
+        # Every include keyword is needed, any exclude keyword rejects
+        ("gold,asia", None, "Gold", "Asia", True),
+        ("gold,eu", None, "Gold", "Asia", False),
+        (None, "silver,asia", "Gold", "Asia", False),
+        (None, "silver,eu", "Gold", "Asia", True),
+        # Keywords match case insensitively across name + server_name
+        ("GOLDAS", None, "gold", "asia", True),
+        # Empty keyword tokens match everything
+        ("gold,,asia", None, "Gold", "Asia", True),
+        ("gold,", None, "Gold", "Asia", True),
+        (None, "silver,,eu", "Gold", "Asia", False),
+        # Regex characters in exclude keywords are literal
+        (None, "g.ld", "Gold", "Asia", True),
+        (None, "(x", "Gold (x)", "Asia", False),
+    ],
+)
+def test_keyword_filter(include_keyword, exclude_keyword, name, server_name, expected):
+    keyword_filter = compile_keyword_filter(include_keyword, exclude_keyword)
+    assert keyword_filter.matches(name, server_name) is expected
+
+
+@pytest.mark.parametrize(
+    "min_price, max_price, price, expected",
+    [
+        (10, None, 10, True),
+        (10, None, 9, False),
+        (10, 20, 20, True),
+        (10, 20, 21, False),
+        # A max price of 0 accepts nothing
+        (0, 0, 0, False),
+        (0, 0, 10, False),
+    ],
+)
+def test_is_price_valid(min_price, max_price, price, expected):
+    matcher = CompetitorMatcher(None, None, frozenset(), min_price, max_price)
+    assert matcher.is_price_valid(price) is expected
+
+
+@pytest.mark.parametrize(
+    "blacklist, shop_name, expected",
+    [
+        (frozenset({"shop"}), "shop", False),
+        # Whole shop names, not substrings
+        (frozenset({"shop"}), "shop1", True),
+        (frozenset({"shop1"}), "shop", True),
+        (frozenset(), "shop", True),
+    ],
+)
+def test_blacklist(blacklist, shop_name, expected):
+    matcher = CompetitorMatcher(None, None, blacklist, 0, None)
+    match = matcher.match([make_product(shop_name=shop_name)])
+    assert bool(match.valid_keywords_products) is expected
+
+
+def test_min_price_product_is_first_cheapest():
+    products = [
+        make_product(price=20, shop_name="a"),
+        make_product(price=10, shop_name="b"),
+        make_product(price=10, shop_name="c"),
+    ]
+    match = CompetitorMatcher(None, None, frozenset(), 0, None).match(products)
+    assert match.min_price_product is products[1]
+
+
+def test_same_result_as_legacy_filter():
+    rng = random.Random(0)
+    words = ["gold", "asia", "eu", "g", "", "(x"]
+
+    def random_keyword():
+        if rng.random() < 0.3:
+            return None
+        return KEYWORD_SPLIT_BY_CHARACTER.join(rng.sample(words, rng.randint(1, 3)))
+
+    for _ in range(2000):
+        products = [
+            make_product(
+                name=rng.choice(["Gold", "gold (x)", "Silver", "G"]),
+                server_name=rng.choice([None, "", "Asia", "EU"]),
+                price=rng.randint(0, 30),
+                shop_name=rng.choice(["a", "b", "c"]),
+            )
+            for _ in range(rng.randint(0, 8))
+        ]
+        include_keyword = random_keyword()
+        exclude_keyword = random_keyword()
+        blacklist = frozenset(rng.sample(["a", "b", "c"], rng.randint(0, 2)))
+        min_price = rng.randint(0, 15)
+        max_price = rng.choice([None, 0, rng.randint(min_price, 30)])
+
+        match = CompetitorMatcher(include_keyword, exclude_keyword, blacklist, min_price, max_price).match(
+            products
+        )
+        valid_keywords_products, valid_products, min_price_product = legacy_match(
+            products, include_keyword, exclude_keyword, blacklist, min_price, max_price
+        )
+        assert match.valid_keywords_products == valid_keywords_products
+        assert match.valid_products == valid_products
+        assert match.min_price_product is min_price_product
+
+
+def make_pages(
+        fetched: list[int],
+        page_count: int = 5,
+        blacklisted_pages: int = 2,
+):
+    """
+    Listing pages of 3 products sorted by price, page n priced n * 100 and
+    up, the first blacklisted_pages sold by the blacklisted shop "bl"
+    """
+    for page in range(1, page_count + 1):
+        fetched.append(page)
+        shop_name = "bl" if page <= blacklisted_pages else "ok"
+        yield CrwlAPIRes(
+            success=True,
+            message="",
+            statusCode="200",
+            data=Data(
+                total_item=page_count * 3,
+                item_per_page=3,
+                current_page=page,
+                data=[make_product(price=page * 100 + i, shop_name=shop_name) for i in range(3)],
+            ),
+        )
+
+
+@pytest.mark.parametrize(
+    "max_price, expected_pages, expected_price",
+    [
+        # Stops at the first page with a valid competitor
+        (None, [1, 2, 3], 300),
+        # Stops once the prices pass the max price
+        (250, [1, 2, 3], None),
+        # Nothing can be valid, no page after the first
+        (0, [1], None),
+    ],
+)
+def test_match_pages_stops_early(max_price, expected_pages, expected_price):
+    fetched = []
+    matcher = CompetitorMatcher(None, None, frozenset({"bl"}), 0, max_price)
+    products, match = matcher.match_pages(make_pages(fetched))
+    assert fetched == expected_pages
+    assert len(products) == len(expected_pages) * 3
+    min_price = match.min_price_product.price if match.min_price_product else None
+    assert min_price == expected_price
+    expected_match = matcher.match(products)
+    assert match.valid_keywords_products == expected_match.valid_keywords_products
+    assert match.valid_products == expected_match.valid_products
+    assert match.min_price_product is expected_match.min_price_product